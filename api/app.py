@@ -1,33 +1,151 @@
 # api/app.py
 
+import json
 import os
-from fastapi import FastAPI, HTTPException
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
-from rag.pipeline import rag_query
-from rag.metadata_matcher import init_embeddings
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+import httpx
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import StreamingResponse
+from rag.pipeline import rag_answer
+from rag.batch import answer_batch, parse_questions
+from rag.ollama_client import CircuitOpenError, OverloadedError, generate_gate, gate_stats
+from rag.deadline import DeadlineExceeded, deadline_scope
+from rag.profiling import annotate, list_profiles, profile_path, profile_scope, should_profile
+from rag.session import SessionStore
+from rag.warmup import warm_up_shared
+from rag.query_cache import embedding_cache
+from rag.index_registry import VALID_NAME, CollectionRegistry, UnknownCollectionError
+from rag.manifest import collection_dir, prune_versions
+from ingestion.jobs import IngestQueue, create_job, job_dir, list_jobs, read_job, write_job
 from config.settings import settings
-
-app = FastAPI(title="RAG Chat API")
+from app_logging import reader as log_reader
 
 LOG_DIR = settings.LOG_DIR
 
-# Load DB at startup
-db = Chroma(
-    collection_name=settings.CHROMA_COLLECTION,
-    persist_directory=settings.CHROMA_PERSIST_DIR,
-    embedding_function=OllamaEmbeddings(model=settings.OLLAMA_EMBEDDING_MODEL,
-                                        base_url=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
-)
+# Open collections (lazy, LRU bounded by memory) + per-collection metrics
+registry = CollectionRegistry()
+
+# Filled in by the startup thread → /readyz reports progress
+index_state = {"status": "starting", "collection": settings.CHROMA_COLLECTION,
+               "index_version": None, "chapters": 0, "error": None,
+               "worker_pid": os.getpid(), "warmup": None}
+LOADING = ("starting", "loading_manifest", "warming_up")
+_load_lock = threading.Lock()
+
+
+def load_index():
+    """Open the default collection and load its routing manifest (memory-mapped)."""
+    if not _load_lock.acquire(blocking=False):
+        return                      # already loading (startup / a publish)
+    try:
+        index_state["status"] = "loading_manifest"
+        handle = registry.acquire(settings.CHROMA_COLLECTION)
+        try:
+            if not len(handle.router):
+                print("[WARN] No chapters found in DB.")
+            print(f"[INFO] Loaded {len(handle.router)} chapter vectors "
+                  f"(index {handle.index_version}).")
+
+            if settings.WARMUP_ON_START:
+                index_state["status"] = "warming_up"
+                run_warm_up(handle)
+            index_state.update(status="ready", index_version=handle.index_version,
+                               chapters=len(handle.router))
+        finally:
+            handle.release()
+    except Exception as e:
+        print(f"[ERROR] Index load failed: {e}")
+        index_state.update(status="error", error=str(e))
+    finally:
+        _load_lock.release()
+
+
+def retry_default_load():
+    """The default collection failed to load (e.g. not built yet) → load it once it exists."""
+    if index_state["status"] == "error" and collection_dir(settings.CHROMA_COLLECTION):
+        index_state["error"] = None
+        load_index()
+
+
+def run_warm_up(handle, preload: bool = True):
+    """Fill the caches from historical queries; a cold start is slow, not broken.
+    One worker computes the warm-up per index version, the others load its result."""
+    try:
+        report = warm_up_shared(handle, preload=preload)
+        index_state["warmup"] = report
+        print(f"[INFO] Warm-up of '{handle.name}' ({report['source']}) in {report['seconds']}s — "
+              f"{report['warmed_queries']} queries, coverage {report['coverage']}")
+    except Exception as e:
+        print(f"[WARN] Warm-up of '{handle.name}' failed: {e}")
+        index_state["warmup"] = {"collection": handle.name, "error": str(e)}
+
+
+def reload_collection(name: str):
+    if name == settings.CHROMA_COLLECTION and index_state["status"] == "error":
+        retry_default_load()
+        return
+    try:
+        status = registry.reload(name)
+    except Exception as e:
+        print(f"[ERROR] Reload of '{name}' failed: {e}")
+        return
+    if status["status"] == "swapped" and settings.WARMUP_ON_START:
+        # the new version starts with empty routing / answer caches
+        handle = registry.acquire(name)
+        try:
+            run_warm_up(handle, preload=False)
+        finally:
+            handle.release()
+
+
+def on_ingest_done(job):
+    """A finished ingest published a new version → swap it in right away."""
+    if job and job["status"] == "done":
+        threading.Thread(target=reload_collection, args=(job["collection"],),
+                         name=f"reload-{job['collection']}", daemon=True).start()
+
+
+# Background PDF ingestion (low-priority worker processes)
+ingest_queue = IngestQueue(on_done=on_ingest_done)
+
 
-# Load & cache chapters embeddings
-collection = db.get()
-chapters = sorted({m["chapter"] for m in collection["metadatas"]})
-if chapters:
-    init_embeddings(chapters)
-    print(f"[INFO] Cached {len(chapters)} chapter embeddings.")
-else:
-    print("[WARN] No chapters found in DB.")
+def watch_index_versions(stop: threading.Event):
+    """File watch: swap in new versions as soon as a build publishes them,
+    and delete replaced versions once INDEX_PRUNE_MIN_AGE has passed."""
+    while not stop.wait(settings.INDEX_WATCH_INTERVAL):
+        retry_default_load()
+        for name in registry.changed_collections():
+            reload_collection(name)
+        for name in registry.known_collections():
+            try:
+                prune_versions(name)
+            except OSError as e:
+                print(f"[WARN] Pruning old versions of '{name}' failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # don't block startup → /healthz answers at once, /readyz once loaded
+    threading.Thread(target=load_index, name="index-loader", daemon=True).start()
+    stop = threading.Event()
+    if settings.INDEX_WATCH_INTERVAL > 0:
+        threading.Thread(target=watch_index_versions, args=(stop,),
+                         name="index-watcher", daemon=True).start()
+    yield
+    stop.set()
+    ingest_queue.shutdown()
+
+
+app = FastAPI(title="RAG Chat API", lifespan=lifespan)
+
+# Conversation sessions (previous turn's vector / chapters / docs / answer)
+sessions = SessionStore()
 
 
 @app.get("/")
@@ -37,19 +155,265 @@ def home():
 
 @app.get("/healthz")
 def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "ollama": gate_stats()}
+
+
+@app.get("/readyz")
+def readiness_check():
+    ready = index_state["status"] == "ready"
+    state = dict(index_state)
+    handle = registry.get_open(settings.CHROMA_COLLECTION)
+    if ready and handle is not None:
+        # reflects hot swaps
+        state.update(index_version=handle.index_version, chapters=len(handle.router))
+    return JSONResponse(status_code=200 if ready else 503, content=state)
+
+
+@app.post("/admin/reload", status_code=202)
+def admin_reload(collection: Optional[str] = None):
+    """Build the new routing state in the background, then swap it in."""
+    name = collection or settings.CHROMA_COLLECTION
+    if name not in registry.known_collections():
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{name}'")
+    threading.Thread(target=reload_collection, args=(name,),
+                     name=f"reload-{name}", daemon=True).start()
+    return {"collection": name, "status": "scheduled"}
+
+
+@app.get("/admin/reload")
+def admin_reload_status():
+    return registry.reloads
+
+
+@app.get("/admin/profiles")
+def admin_list_profiles(limit: int = Query(50, gt=0, le=1000)):
+    """Stored request profiles, newest first (span timings summary only)."""
+    return {"profiles": list_profiles(limit)}
+
+
+@app.get("/admin/profiles/{profile_id}")
+def admin_get_profile(profile_id: str):
+    """Span tree of one profiled request (routing, retrieval, generation, ...)."""
+    path = profile_path(profile_id, "json")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@app.get("/admin/profiles/{profile_id}/folded")
+def admin_get_profile_folded(profile_id: str):
+    """Sampled stacks in folded format → flamegraph.pl / speedscope / inferno."""
+    path = profile_path(profile_id, "folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return FileResponse(path, media_type="text/plain",
+                        filename=f"profile-{profile_id}.folded")
+
+
+@app.get("/collections")
+def list_collections():
+    return {"default": settings.CHROMA_COLLECTION,
+            "available": registry.known_collections(),
+            "cache": registry.stats()}
+
+
+@app.get("/metrics")
+def metrics():
+    return {"collections": registry.stats(), "ollama": gate_stats(),
+            "caches": {"query_embeddings": embedding_cache.stats()},
+            "warmup": index_state["warmup"]}
+
+
+def _overloaded(e: OverloadedError):
+    return HTTPException(status_code=429, detail=str(e),
+                         headers={"Retry-After": str(e.retry_after)})
+
+
+def require_ready(name: Optional[str]):
+    """
+    503 only while the default collection is still loading at startup. Other
+    collections open lazily on first use, and a default that failed to load is
+    retried by the registry (404 while it doesn't exist).
+    """
+    if (name or settings.CHROMA_COLLECTION) == settings.CHROMA_COLLECTION \
+            and index_state["status"] in LOADING:
+        raise HTTPException(status_code=503, detail="Index is not loaded yet",
+                            headers={"Retry-After": "5"})
+
+
+@contextmanager
+def use_collection(name: Optional[str]):
+    """Hold an open collection for the duration of one request."""
+    name = name or settings.CHROMA_COLLECTION
+    try:
+        handle = registry.acquire(name)
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{name}'")
+    try:
+        yield handle
+    finally:
+        handle.release()
 
 
 @app.post("/ask")
-def ask_question(query: str):
+def ask_question(query: str, session_id: Optional[str] = None,
+                 collection: Optional[str] = None, full: bool = False,
+                 deadline: Optional[float] = Query(None, gt=0,
+                                                   le=settings.REQUEST_DEADLINE_SECONDS),
+                 x_profile: Optional[str] = Header(None)):
+    """
+    `full=true` → always generate (skip the extractive fast path).
+    `deadline` → seconds the caller will wait (default REQUEST_DEADLINE_SECONDS).
+    `X-Profile: 1` header → profile this request (see GET /admin/profiles/{profile_id}).
+    """
     if not query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
+    require_ready(collection)
+
+    # reject early instead of queueing behind a full generation backlog
+    if generate_gate.saturated():
+        raise _overloaded(OverloadedError(generate_gate.name, generate_gate.retry_after()))
+
+    with use_collection(collection) as handle:
+        session = sessions.get_or_create(session_id)
+
+        start, ok, path = time.monotonic(), False, None
+        try:
+            with profile_scope("ask", should_profile(x_profile), query=query[:200],
+                               collection=handle.name,
+                               index_version=handle.index_version) as profile, \
+                    deadline_scope(deadline or settings.REQUEST_DEADLINE_SECONDS), \
+                    session.turn():
+                session.bind(handle.name)
+                result = rag_answer(handle.db, query, session=session,
+                                    router=handle.router, full=full,
+                                    answer_cache=handle.answers,
+                                    chunk_store=handle.chunks)
+                annotate(path=result["path"])
+            ok, path = True, result["path"]
+            response = {"query": query, "response": result["response"],
+                        "path": path, "citations": result["citations"],
+                        "collection": handle.name,
+                        "session_id": session.session_id}
+            if profile is not None:
+                response["profile_id"] = profile.id
+            return response
+        except OverloadedError as e:
+            raise _overloaded(e)
+        except CircuitOpenError as e:
+            raise HTTPException(status_code=503, detail=str(e),
+                                headers={"Retry-After": str(e.retry_after)})
+        except ConnectionError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except (DeadlineExceeded, httpx.TimeoutException) as e:
+            raise HTTPException(status_code=504, detail=str(e) or "Ollama call timed out")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            registry.metrics(handle.name).observe(time.monotonic() - start, ok, path)
+
+
+@app.post("/ask/batch")
+async def ask_batch(request: Request, collection: Optional[str] = None,
+                    concurrency: Optional[int] = Query(None, gt=0,
+                                                      le=generate_gate.max_concurrency)):
+    """
+    Body: JSONL, one {"id": ..., "query": ...} per line.
+    Response: JSONL, one result per question, streamed as each one completes.
+    """
+    body = (await request.body()).decode("utf-8", errors="replace")
     try:
-        response = rag_query(db, query)
-        return {"query": query, "response": response}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        questions = parse_questions(body.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions in request body")
+    if len(questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch")
+
+    require_ready(collection)
+
+    name = collection or settings.CHROMA_COLLECTION
+    try:
+        handle = await run_in_threadpool(registry.acquire, name)
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{name}'")
+
+    def stream():
+        # the handle stays held until the last result is sent (hot swaps wait for it)
+        metrics = registry.metrics(handle.name)
+        try:
+            for result in answer_batch(handle.db, handle.router, questions,
+                                       concurrency=concurrency,
+                                       chunk_store=handle.chunks):
+                status = result["status"]
+                metrics.observe(result["timings"]["prepare_s"]
+                                + result["timings"]["generation_s"],
+                                status != "error",
+                                "generated" if status == "ok" else
+                                None if status == "error" else
+                                status if status == "degraded" else "no_answer")
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            handle.release()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/ingest", status_code=202)
+def ingest_document(file: UploadFile = File(...), collection: Optional[str] = None):
+    """
+    Upload a PDF → parsed, chunked and embedded in the background.
+    Poll GET /ingest/{job_id}; the collection is hot-swapped when the job is done.
+    """
+    name = collection or settings.CHROMA_COLLECTION
+    if not VALID_NAME.match(name):
+        raise HTTPException(status_code=400, detail=f"Invalid collection name '{name}'")
+
+    filename = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(file.filename or ""))
+    if not filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files can be ingested")
+
+    job = create_job(filename, name)
+    max_bytes, size = settings.INGEST_MAX_UPLOAD_MB * 1024 * 1024, 0
+    with open(os.path.join(job_dir(job["id"]), filename), "wb") as f:
+        while chunk := file.file.read(1024 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            f.write(chunk)
+    if size > max_bytes or size == 0:
+        job.update(status="failed", error="empty upload" if size == 0 else "upload too large")
+        write_job(job)
+        raise HTTPException(status_code=413 if size else 400,
+                            detail=f"PDF must be 1 byte to {settings.INGEST_MAX_UPLOAD_MB} MB")
+
+    ingest_queue.submit(job)
+    return job
+
+
+@app.get("/ingest")
+def list_ingest_jobs(limit: int = Query(50, gt=0, le=1000)):
+    return {"jobs": list_jobs(limit)}
+
+
+@app.get("/ingest/{job_id}")
+def ingest_job_status(job_id: str):
+    job = read_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job")
+    return job
+
+
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str):
+    sessions.drop(session_id)
+    return {"session_id": session_id, "status": "dropped"}
 
 
 @app.get("/logs")
@@ -61,16 +425,66 @@ def list_logs():
     return {"files": files}
 
 
+def _log_path(filename: str) -> str:
+    path = log_reader.resolve_log_path(LOG_DIR, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Log file not found")
+    return path
+
+
 @app.get("/logs/{filename}")
-def read_log_file(filename: str):
-    filepath = os.path.join(LOG_DIR, filename)
+def read_log_file(filename: str,
+                  offset: int = Query(0, description="Byte offset (negative = from end)"),
+                  limit: int = Query(settings.LOG_PAGE_BYTES, gt=0,
+                                     le=settings.LOG_MAX_PAGE_BYTES)):
+    filepath = _log_path(filename)
 
-    if not os.path.isfile(filepath):
-        raise HTTPException(status_code=404, detail="Log file not found")
+    try:
+        page = log_reader.read_page(filepath, offset=offset, limit=limit)
+        return {"filename": filename, **page}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/logs/{filename}/search")
+def search_log_file(filename: str,
+                    q: Optional[str] = None,
+                    level: Optional[str] = None,
+                    logger: Optional[str] = None,
+                    offset: int = Query(0, ge=0),
+                    max_results: int = Query(200, gt=0, le=5000),
+                    max_scan_bytes: Optional[int] = Query(None, gt=0)):
+    filepath = _log_path(filename)
 
     try:
-        with open(filepath, "r") as file:
-            content = file.read()
-        return {"filename": filename, "content": content}
+        result = log_reader.search(filepath, text=q, level=level, logger=logger,
+                                   offset=offset, max_results=max_results,
+                                   max_scan_bytes=max_scan_bytes)
+        return {"filename": filename, **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/logs/{filename}/tail")
+def tail_log_file(filename: str,
+                  lines: int = Query(100, ge=0, le=10000),
+                  follow: bool = False,
+                  max_seconds: int = Query(settings.LOG_TAIL_MAX_SECONDS, gt=0,
+                                           le=settings.LOG_TAIL_MAX_SECONDS)):
+    filepath = _log_path(filename)
+    start = log_reader.tail_offset(filepath, lines)
+    end = start
+
+    def backlog():
+        nonlocal end
+        for _, end, _, _, line in log_reader.iter_records(filepath, start):
+            yield line + "\n"
+
+    async def stream():
+        async for line in iterate_in_threadpool(backlog()):
+            yield line
+        if follow:
+            async for line in log_reader.follow(filepath, offset=end, max_seconds=max_seconds):
+                yield line
+
+    return StreamingResponse(stream(), media_type="text/plain")
@@ -1,32 +1,165 @@
-# logging/config.py
+# app_logging/config.py
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
 from pathlib import Path
 from datetime import datetime
 
+from config.settings import settings
+
+FORMATTER = logging.Formatter(
+    "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    "%Y-%m-%d %H:%M:%S"
+)
+
+_log_queue = None
+_listener = None
+
+
+# ---------------- FILE HANDLER ----------------
+class DailySizeRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Write to `<log_dir>/<YYYY-MM-DD>.log`.
+
+    - Switches to a new file when the date changes (midnight rollover).
+    - Rolls the current day over to `<date>.1.log`, `<date>.2.log`, ...
+      once it grows past `max_bytes` (keeps `backup_count` of them).
+
+    Several processes (API workers, ingest workers) append to the same file:
+    a size rollover happens under a lock file, by whichever process gets there
+    first, and the others notice the rename and reopen the new file.
+    """
+
+    def __init__(self, log_dir, max_bytes=0, backup_count=0, encoding="utf-8"):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.current_date = self._today()
+        self._pending = 0            # bytes of the record that triggered the rollover
+        super().__init__(self._path_for(self.current_date), "a",
+                         encoding=encoding, delay=True)
+
+    @staticmethod
+    def _today():
+        return datetime.now().strftime("%Y-%m-%d")
+
+    def _path_for(self, date, index=0):
+        suffix = f".{index}" if index else ""
+        return str(self.log_dir / f"{date}{suffix}.log")
+
+    def _rotated_away(self) -> bool:
+        """Another process renamed the file we have open → reopen it by name."""
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+        return not os.path.samestat(on_disk, os.fstat(self.stream.fileno()))
+
+    def shouldRollover(self, record):
+        if self._today() != self.current_date:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is not None and self._rotated_away():
+                self.stream.close()
+                self.stream = None
+            if self.stream is None:
+                self.stream = self._open()
+            # bytes, not characters; the file size, not our own offset (others append too)
+            self._pending = len(f"{self.format(record)}\n".encode(self.encoding or "utf-8",
+                                                                  errors="replace"))
+            if os.fstat(self.stream.fileno()).st_size + self._pending >= self.max_bytes:
+                return True
+        return False
+
+    def _size_rollover(self):
+        current = self._path_for(self.current_date)
+        # another process may have rolled over while we waited for the lock
+        if not os.path.exists(current) or \
+                os.path.getsize(current) + self._pending < self.max_bytes:
+            return
+        if self.backup_count > 0:
+            # shift <date>.N.log up by one and move current to .1
+            for i in range(self.backup_count - 1, 0, -1):
+                src = self._path_for(self.current_date, i)
+                dst = self._path_for(self.current_date, i + 1)
+                if os.path.exists(src):
+                    os.replace(src, dst)
+            os.replace(current, self._path_for(self.current_date, 1))
+        else:
+            # no backups wanted → truncate
+            open(current, "w").close()
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        today = self._today()
+        if today != self.current_date:
+            # midnight → start a fresh file for the new day
+            self.current_date = today
+        else:
+            from rag.manifest import file_lock   # numpy → only on the rare rollover
+            try:
+                with file_lock(str(self.log_dir / ".rotate.lock")):
+                    self._size_rollover()
+            except PermissionError:
+                pass    # Windows: another process holds the file open → keep appending
+
+        self.baseFilename = os.path.abspath(self._path_for(self.current_date))
+        self.stream = self._open()
+
+
+# ---------------- QUEUE LISTENER ----------------
+def _start_listener():
+    """Start ONE background listener shared by every logger."""
+    global _log_queue, _listener
+
+    fh = DailySizeRotatingFileHandler(settings.LOG_DIR,
+                                      max_bytes=settings.LOG_MAX_BYTES,
+                                      backup_count=settings.LOG_BACKUP_COUNT)
+    sh = logging.StreamHandler()
+    fh.setFormatter(FORMATTER)
+    sh.setFormatter(FORMATTER)
+
+    _log_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        _log_queue, fh, sh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush everything still queued (called automatically at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def get_logger(name: str, level=logging.INFO):
     """Create a modular logger for any module."""
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-
-    file_path = log_dir / f"{datetime.now().strftime('%Y-%m-%d')}.log"
+    if _listener is None:
+        _start_listener()
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
+    # only the (cheap) queue put happens on the caller's thread
     if not logger.handlers:
-        fh = logging.FileHandler(file_path)
-        sh = logging.StreamHandler()
+        logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
-        formatter = logging.Formatter(
-            "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-            "%Y-%m-%d %H:%M:%S"
-        )
-
-        fh.setFormatter(formatter)
-        sh.setFormatter(formatter)
+    return logger
 
-        logger.addHandler(fh)
-        logger.addHandler(sh)
 
-    return logger
+# ---------------- PAYLOAD SAMPLING ----------------
+def payload_sampled(rate: float = None) -> bool:
+    """Decide whether this request logs full prompt / reply payloads."""
+    rate = settings.LOG_PAYLOAD_SAMPLE_RATE if rate is None else rate
+    if rate <= 0:
+        return False
+    return rate >= 1 or random.random() < rate
@@ -0,0 +1,187 @@
+# app_logging/reader.py
+# Streaming, byte-offset based log access (never loads a whole file).
+
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+# "2025-11-20 10:00:00 | INFO | QUERY | message"
+LINE_RE = re.compile(
+    r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \| (?P<level>\w+) \| (?P<logger>[^|]+?) \| ")
+
+BLOCK_SIZE = 64 * 1024
+
+
+def resolve_log_path(log_dir: str, filename: str) -> Optional[str]:
+    """Return the path of `filename` inside `log_dir` (no traversal), or None."""
+    if os.path.basename(filename) != filename or not filename.endswith(".log"):
+        return None
+    path = os.path.join(log_dir, filename)
+    return path if os.path.isfile(path) else None
+
+
+def _align_to_line(f, offset: int) -> int:
+    """Move `offset` forward to the start of the next full line."""
+    if offset <= 0:
+        return 0
+    f.seek(offset - 1)
+    if f.read(1) == b"\n":
+        return offset
+    f.readline()
+    return f.tell()
+
+
+# ---------------- PAGINATION ----------------
+def read_page(path: str, offset: int = 0, limit: int = BLOCK_SIZE) -> Dict:
+    """
+    Read up to `limit` bytes of whole lines starting at `offset`.
+    A negative offset counts back from the end of the file (last page).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if offset < 0:
+            offset = max(0, size + offset)
+        start = _align_to_line(f, min(offset, size))
+        f.seek(start)
+        data = f.read(limit)
+
+        end = start + len(data)
+        if end < size:
+            cut = data.rfind(b"\n")
+            if cut >= 0:
+                data = data[:cut + 1]
+            else:
+                # a single line longer than `limit` → return it whole
+                data += f.readline()
+            end = start + len(data)
+
+    return {
+        "content": data.decode("utf-8", errors="replace"),
+        "offset": start,
+        "next_offset": end,
+        "size": size,
+        "eof": end >= size,
+    }
+
+
+def tail_offset(path: str, lines: int) -> int:
+    """Byte offset where the last `lines` lines of the file begin."""
+    size = os.path.getsize(path)
+    if lines <= 0:
+        return size
+
+    with open(path, "rb") as f:
+        pos, found = size, 0
+        # ignore the newline that terminates the last line
+        if size:
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                pos -= 1
+        while pos > 0:
+            step = min(BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            for i in range(len(block) - 1, -1, -1):
+                if block[i] == 0x0A:
+                    found += 1
+                    if found == lines:
+                        return pos + i + 1
+    return 0
+
+
+# ---------------- STREAMING SCAN ----------------
+def iter_records(path: str, offset: int = 0) -> Iterator[Tuple[int, int, str, str, str]]:
+    """
+    Yield (start, end, level, logger, line) for every line from `offset`.
+    Continuation lines (e.g. tracebacks) inherit the previous record's level.
+    """
+    level, logger = "", ""
+    with open(path, "rb") as f:
+        pos = _align_to_line(f, offset)
+        f.seek(pos)
+        for raw in f:
+            end = pos + len(raw)
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            m = LINE_RE.match(line)
+            if m:
+                level, logger = m.group("level"), m.group("logger").strip()
+            yield pos, end, level, logger, line
+            pos = end
+
+
+def search(path: str, text: str = None, level: str = None, logger: str = None,
+           offset: int = 0, max_results: int = 200, max_scan_bytes: int = None) -> Dict:
+    """
+    Filter lines by level / logger / substring (case-insensitive).
+    Stops after `max_results` matches or `max_scan_bytes`; resume from `next_offset`.
+    """
+    needle = text.lower() if text else None
+    level = level.upper() if level else None
+    logger = logger.upper() if logger else None
+
+    matches, counts = [], {}
+    next_offset = offset
+    for start, end, lvl, lgr, line in iter_records(path, offset):
+        next_offset = end
+        if lvl and LINE_RE.match(line):    # records, not their continuation lines
+            counts[lvl] = counts.get(lvl, 0) + 1
+
+        if level and lvl != level:
+            pass
+        elif logger and lgr.upper() != logger:
+            pass
+        elif needle and needle not in line.lower():
+            pass
+        else:
+            matches.append({"offset": start, "line": line})
+            if len(matches) >= max_results:
+                break
+
+        if max_scan_bytes and end - offset >= max_scan_bytes:
+            break
+
+    size = os.path.getsize(path)
+    return {
+        "matches": matches,
+        "level_counts": counts,
+        "scanned_from": offset,
+        "next_offset": next_offset,
+        "size": size,
+        "eof": next_offset >= size,
+    }
+
+
+async def follow(path: str, offset: int = None, poll: float = 0.5,
+                 max_seconds: float = None) -> AsyncIterator[str]:
+    """
+    Yield complete lines as they are appended (like `tail -f`).
+    Starts at `offset` (default: end of file); gives up after `max_seconds`.
+    Async → an idle follower waits on the event loop, not on a threadpool thread.
+    """
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    pos = os.path.getsize(path) if offset is None else offset
+    partial = b""
+
+    while deadline is None or time.monotonic() < deadline:
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size < pos:
+            # file was rotated / truncated → start over
+            pos, partial = 0, b""
+
+        if size > pos:
+            with open(path, "rb") as f:
+                f.seek(pos)
+                data = f.read(size - pos)
+            pos = size
+            data = partial + data
+            *lines, partial = data.split(b"\n")
+            for raw in lines:
+                yield raw.decode("utf-8", errors="replace").rstrip("\r") + "\n"
+        else:
+            await asyncio.sleep(poll)
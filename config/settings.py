@@ -1,22 +1,94 @@
 # config/settings.py
 
 import os
+from typing import List
 from pydantic import BaseModel
 
 
+def _env_hosts(name: str, default: str = "") -> List[str]:
+    """Comma-separated Ollama base URLs from the environment."""
+    return [h.strip() for h in os.getenv(name, default).split(",") if h.strip()]
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """On/off switch from the environment (1/true/yes/on), e.g. per deployment."""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
 class Settings(BaseModel):
     # ====== DATABASE ======
-    CHROMA_COLLECTION: str = "manual_chunks"
+    CHROMA_COLLECTION: str = "manual_chunks"     # default when a request names none
+    COLLECTION_CACHE_MAX_BYTES: int = 2 * 1024 ** 3   # memory budget of open collections
+    INDEX_KEEP_VERSIONS: int = 2          # versions kept on disk per collection (live + previous)
+    INDEX_PRUNE_MIN_AGE: float = 900.0    # seconds a replaced version stays before it may be deleted
+    INDEX_WATCH_INTERVAL: float = 10.0    # seconds between CURRENT checks (0 = no file watch)
     CHROMA_PERSIST_DIR: str = os.path.join("data", "chroma_db")
     PROCESSED_RAW_BLOCKS_PATH: str = os.path.join(
         "data", "processed_csv", "raw_blocks.json")
 
+    # ====== HNSW INDEX (construction → new builds only; search ef → applied on open) ======
+    HNSW_SPACE: str = "l2"                # l2 | cosine | ip
+    HNSW_M: int = 16                      # links per node (Chroma: max_neighbors)
+    HNSW_CONSTRUCTION_EF: int = 100       # candidate list while building
+    HNSW_SEARCH_EF: int = 100             # candidate list while querying (≥ k)
+
+    # ====== DOCUMENT INGESTION (POST /ingest) ======
+    INGEST_DIR: str = os.path.join("data", "ingest")   # uploads + job status files
+    INGEST_MAX_UPLOAD_MB: int = 200
+    INGEST_WORKERS: int = 1               # ingest jobs running at once (worker processes)
+    INGEST_NICE: int = 10                 # worker process priority (higher = lower priority)
+    INGEST_CPUS: List[int] = []           # pin workers to these CPUs (empty = any)
+    INGEST_CPU_THREADS: int = 1           # threads for numeric libraries in a worker
+    INGEST_EMBED_CONCURRENCY: int = 1     # embedding calls in flight per job
+
+    # ====== PROFILING (per request, opt-in) ======
+    PROFILE_SAMPLE_RATE: float = 0.0      # share of /ask requests profiled (0 = on request only)
+    PROFILE_ALLOW_HEADER: bool = True     # "X-Profile: 1" profiles that request
+    PROFILE_INTERVAL_MS: float = 5        # stack sampling interval
+    PROFILE_DIR: str = os.path.join("data", "profiles")
+    PROFILE_KEEP: int = 200               # newest profiles kept on disk
+
     # ====== LOGGING ======
     LOG_DIR: str = os.path.join("logs")
+    LOG_MAX_BYTES: int = 50 * 1024 * 1024   # roll the day's file over past this size
+    LOG_BACKUP_COUNT: int = 10              # <date>.1.log ... <date>.N.log kept per day
+    LOG_PAYLOAD_SAMPLE_RATE: float = 0.05   # share of requests logging full prompt/reply
+    LOG_PAGE_BYTES: int = 64 * 1024         # default page size for GET /logs/{file}
+    LOG_MAX_PAGE_BYTES: int = 4 * 1024 * 1024
+    LOG_TAIL_MAX_SECONDS: int = 300         # max lifetime of a followed tail stream
+
+    # ====== OLLAMA CONNECTION POOL / ADMISSION ======
+    OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    OLLAMA_HOSTS: List[str] = _env_hosts("OLLAMA_HOSTS", OLLAMA_HOST)  # all backends
+    OLLAMA_EMBED_HOSTS: List[str] = _env_hosts("OLLAMA_EMBED_HOSTS")   # empty → OLLAMA_HOSTS
+    OLLAMA_GENERATE_HOSTS: List[str] = _env_hosts("OLLAMA_GENERATE_HOSTS")
+    OLLAMA_HEALTH_INTERVAL: float = 10.0    # seconds between backend health checks
+    OLLAMA_EMBED_HEDGE_AFTER: float = 0.0   # >0 → resend a slow embedding to a 2nd backend
+    OLLAMA_POOL_MAX_CONNECTIONS: int = 16   # keep-alive connections per host
+    OLLAMA_KEEPALIVE_EXPIRY: float = 60.0   # seconds an idle connection is kept
+    OLLAMA_EMBED_CONCURRENCY: int = 4       # embedding calls in flight at once (per backend)
+    OLLAMA_EMBED_QUEUE: int = 64            # embedding calls allowed to wait
+    OLLAMA_GENERATE_CONCURRENCY: int = 1    # generations in flight at once (per backend)
+    OLLAMA_GENERATE_QUEUE: int = 4          # generations allowed to wait → then 429
+    OLLAMA_QUEUE_TIMEOUT: float = 30.0      # max seconds spent waiting for a slot
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0     # seconds to open a connection
+    OLLAMA_EMBED_TIMEOUT: float = 30.0      # max seconds one embedding call may take
+    OLLAMA_GENERATE_TIMEOUT: float = 180.0  # max seconds one generation may take
+    OLLAMA_BREAKER_FAILURES: int = 5        # failures in a row → fail fast (circuit open)
+    OLLAMA_BREAKER_RESET: float = 30.0      # seconds before one trial call is let through
+
+    # ====== REQUEST DEADLINES ======
+    REQUEST_DEADLINE_SECONDS: float = 60.0  # budget of one /ask, shared by every stage
+    GENERATE_MIN_BUDGET: float = 5.0        # less left than this → answer with passages
 
     # ====== EMBEDDINGS ======
     OLLAMA_EMBEDDING_MODEL: str = "mxbai-embed-large"
 
+    BUILD_EMBED_BATCH: int = 64             # chunks per embedding call when building an index
+
     # ====== LLM MODEL ======
     LLM_MODEL: str = "llama3.2:3b"    # or "llama3" or anything you use
 
@@ -24,6 +96,43 @@ class Settings(BaseModel):
     SIM_THRESHOLD: float = 0.50       # if similarity < threshold, ignore
     CONTEXT_THRESHOLD: float = 0.35   # if context similarity < threshold, ignore
 
+    # ====== QUERY CACHES / WARM-UP ======
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096  # query text → embedding
+    ROUTING_CACHE_SIZE: int = 4096          # query → chapter scores (per index version)
+    ANSWER_CACHE_SIZE: int = 512            # first-turn query → answer (per index version)
+    WARMUP_ON_START: bool = _env_flag("WARMUP_ON_START", True)  # warm caches before ready
+    WARMUP_LOG_DAYS: int = 7                # most recent days of logs mined for queries
+    WARMUP_TOP_QUERIES: int = 200           # most frequent queries embedded + routed
+    WARMUP_ANSWERS: int = 0                 # of those, how many to pre-answer (LLM calls)
+    WARMUP_CACHE_TTL: int = 86400           # shared warm-up result reused by workers for (s)
+    OLLAMA_KEEP_ALIVE: str = "30m"          # how long preloaded models stay resident
+
+    # ====== NEIGHBOUR CHUNK EXPANSION ======
+    CONTEXT_NEIGHBOR_TOKENS: int = 256          # per context chunk: prev/next chunk text added (0 = off)
+    CONTEXT_NEIGHBOR_SAME_CHAPTER: bool = True  # never expand across a chapter boundary
+
+    # ====== EXTRACTIVE FAST PATH ======
+    FAST_PATH_ENABLED: bool = False         # answer lookups with a sentence, no LLM call (opt-in)
+    FAST_PATH_CHUNK_SIM: float = 0.75       # top chunk must be at least this close to the query
+    FAST_PATH_SENTENCE_SIM: float = 0.80    # ...and its best sentence at least this close
+    FAST_PATH_MAX_SENTENCES: int = 2        # sentences returned (document order)
+    FAST_PATH_MIN_WORDS: int = 4            # shorter fragments are not candidate answers
+
+    # ====== BATCH QUESTION ANSWERING ======
+    BATCH_MAX_QUESTIONS: int = 10000        # per /ask/batch request
+    BATCH_BLOCK_SIZE: int = 256             # questions prepared (embed/route/retrieve) together
+    BATCH_EMBED_SIZE: int = 64              # texts per embedding call
+    BATCH_GENERATE_CONCURRENCY: int = 1     # generations a batch keeps in flight
+    BATCH_RETRY_MAX_SECONDS: float = 300    # per question: stop waiting out 429s → "error"
+
+    # ====== CONVERSATION SESSIONS ======
+    SESSION_TTL_SECONDS: int = 30 * 60      # idle sessions are dropped after this
+    SESSION_MAX_SESSIONS: int = 1000        # LRU bound on sessions kept in memory
+    SESSION_MAX_DOCS: int = 6               # retrieved docs carried to the next turn
+    SESSION_REUSE_SIM: float = 0.95         # follow-up ≈ same question → reuse docs as-is
+    SESSION_EXTEND_SIM: float = 0.80        # close follow-up → reuse chapters, add new docs
+    SESSION_PREV_ANSWER_TOKENS: int = 256   # budget for the previous answer in the prompt
+
 
 # create a settings object you can import everywhere
 settings = Settings()
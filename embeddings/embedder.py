@@ -1,53 +1,120 @@
 # embeddings/embedder.py
 
 import json
-import os
 import time
-from tqdm import tqdm
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rag.ollama_client import embed_gate, embed_pool, get_embeddings
+from rag.manifest import (build_manifest, hnsw_config, ingest_lock, new_version_dir,
+                          publish_version)
+from rag.chunk_store import write_chunk_store
 from config.settings import settings
 
 
-def build_chroma_db(input_file: str, persist_dir: str, limit: int = None):
+def build_chroma_db(input_file: str, persist_dir: str = None, limit: int = None,
+                    collection: str = None):
+    """
+    Embed chunks into a collection. Without `persist_dir` a NEW version is built
+    under data/chroma_db/<collection>/versions/ and published (CURRENT) at the end,
+    so a running API can hot-swap to it.
+    """
+    collection = collection or settings.CHROMA_COLLECTION
+    version = None
+    if persist_dir is None:
+        version, persist_dir = new_version_dir(collection)
+        print(f"[INFO] Building {collection} version {version} → {persist_dir}")
     data = json.load(open(input_file, "r", encoding="utf-8"))
 
     if limit:
         data = data[:limit]
         print(f"[INFO] Using ONLY first {limit} chunks (out of {len(data)})")
 
-    texts = [d["text"] for d in data]
-    metadatas = [
-        {
-            "chapter": d["chapter"],
-            "page": d["page"],
-            "keywords": ", ".join(d.get("keywords", []))
-            if isinstance(d.get("keywords"), list) else ""
-        }
-        for d in data
-    ]
-
-    embeddings = OllamaEmbeddings(model=settings.OLLAMA_EMBEDDING_MODEL,
-                                  base_url=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
-
-    vectordb = Chroma(
-        collection_name="manual_chunks",
-        embedding_function=embeddings,
-        persist_directory=persist_dir,
-    )
+    vectordb = open_collection(persist_dir, collection)
 
-    print(f"[INFO] Starting embedding of {len(texts)} chunks...")
+    print(f"[INFO] Starting embedding of {len(data)} chunks on "
+          f"{len(embed_pool.backends)} Ollama backend(s)...")
     start = time.time()
 
-    for i in tqdm(range(len(texts)), desc="Embedding chunks", unit="chunk"):
-        vectordb.add_texts(
-            texts=[texts[i]],
-            metadatas=[metadatas[i]]
-        )
+    from tqdm import tqdm
+    with tqdm(total=len(data), desc="Embedding chunks", unit="chunk") as bar:
+        embed_chunks(vectordb, data, progress=lambda done, total, n: bar.update(n))
 
     total_time = time.time() - start
-    print(f"\n[OK] Stored {len(texts)} chunks - {persist_dir}")
+    print(f"\n[OK] Stored {len(data)} chunks - {persist_dir}")
     print(f"[TIME] Total elapsed: {total_time:.2f} sec")
-    print(f"[SPEED] Avg per chunk: {total_time/len(texts):.3f} sec")
+    print(f"[SPEED] Avg per chunk: {total_time/len(data):.3f} sec")
+
+    write_chunk_store(persist_dir, data)   # neighbour chunks for context expansion
+    write_manifest_for(vectordb, persist_dir, collection, index_version=version)
+    if version:
+        # same lock as API ingest jobs → never published in the middle of one
+        with ingest_lock(collection):
+            publish_version(collection, version)
+        print(f"[OK] Published {collection} version {version}")
+    return len(data)
+
+
+def chunk_metadata(d: dict) -> dict:
+    meta = {
+        "chapter": d["chapter"],
+        "page": d["page"],
+        "source": d.get("source", ""),
+        "keywords": ", ".join(d.get("keywords", []))
+        if isinstance(d.get("keywords"), list) else ""
+    }
+    if d.get("chunk_index") is not None:
+        meta["chunk_index"] = int(d["chunk_index"])   # → rag/chunk_store.py neighbours
+    return meta
+
+
+def embed_chunks(vectordb, data: list, workers: int = None, batch_size: int = None,
+                 progress=None) -> int:
+    """
+    Embed chunk dicts in batches, in parallel (least-loaded backend each), and
+    upsert them as each batch finishes → an interrupted run keeps what it stored.
+    Queries see the chunks only once the version they go into is published.
+    `progress(done, total, batch_len)` is called after every stored batch.
+    """
+    ids = [str(d.get("id") or i) for i, d in enumerate(data)]
+    texts = [d["text"] for d in data]
+    metadatas = [chunk_metadata(d) for d in data]
+
+    size = batch_size or settings.BUILD_EMBED_BATCH
+    batches = [range(i, min(i + size, len(texts))) for i in range(0, len(texts), size)]
+    embedder = get_embeddings()
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers or embed_gate.max_concurrency) as pool:
+        futures = {pool.submit(embedder.embed_documents, [texts[i] for i in b]): b
+                   for b in batches}
+        for fut in as_completed(futures):
+            b = futures[fut]
+            vectordb._collection.upsert(
+                ids=[ids[i] for i in b],
+                embeddings=fut.result(),
+                documents=[texts[i] for i in b],
+                metadatas=[metadatas[i] for i in b])
+            done += len(b)
+            if progress:
+                progress(done, len(texts), len(b))
+    return done
+
+
+def open_collection(persist_dir: str, collection: str = None):
+    # HNSW settings only take effect when the collection is created (new builds)
+    from langchain_chroma import Chroma   # heavy (chromadb) → only when a DB is opened
+    return Chroma(
+        collection_name=collection or settings.CHROMA_COLLECTION,
+        embedding_function=get_embeddings(),
+        persist_directory=persist_dir,
+        collection_configuration=hnsw_config(),
+    )
+
 
-    return len(texts)
+def write_manifest_for(vectordb, persist_dir: str, collection: str = None,
+                       index_version: str = None):
+    """Chapter list + routing vectors + index version, read by the API at startup."""
+    manifest = build_manifest(vectordb, persist_dir,
+                              collection or settings.CHROMA_COLLECTION, get_embeddings(),
+                              index_version=index_version)
+    print(f"[OK] Manifest written — {len(manifest['chapters'])} chapters "
+          f"(index {manifest['index_version']})")
+    return manifest
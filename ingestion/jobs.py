@@ -0,0 +1,254 @@
+# ingestion/jobs.py
+
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from config.settings import settings
+
+STAGES = ["queued", "parsing", "chunking", "keywords", "embedding", "publishing", "done"]
+UUID_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+CHUNK_ID = re.compile(r"^(.+\.pdf)_p\d+_c\d+$", re.IGNORECASE)   # ingestion/chunker.py ids
+PAGE_SIZE = 5000
+
+
+# ---------------- JOB FILES ----------------
+# <INGEST_DIR>/<job_id>/job.json   → status + progress (shared by every API worker)
+# <INGEST_DIR>/<job_id>/<file>.pdf → the upload
+def job_dir(job_id: str) -> str:
+    return os.path.join(settings.INGEST_DIR, job_id)
+
+
+def write_job(job: dict):
+    path = os.path.join(job_dir(job["id"]), "job.json")
+    tmp = path + ".tmp"
+    job["updated"] = time.time()
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+
+
+def read_job(job_id: str):
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+        return None
+    try:
+        with open(os.path.join(job_dir(job_id), "job.json"), "r", encoding="utf-8") as f:
+            job = json.load(f)
+    except FileNotFoundError:
+        return None
+    # the worker process died mid-job (crash, API restart) → report it
+    if job["status"] == "queued" and not _pid_alive(job.get("api_pid")):
+        job.update(status="failed", error="API process exited before the job started")
+    elif job["status"] not in ("queued", "done", "failed") and not _pid_alive(job.get("pid")):
+        job.update(status="failed", error="worker exited before the job finished")
+    return job
+
+
+def list_jobs(limit: int = 50) -> list:
+    if not os.path.isdir(settings.INGEST_DIR):
+        return []
+    jobs = [read_job(j) for j in os.listdir(settings.INGEST_DIR)]
+    jobs = [j for j in jobs if j]
+    return sorted(jobs, key=lambda j: j["created"], reverse=True)[:limit]
+
+
+def create_job(filename: str, collection: str) -> dict:
+    job_id = uuid.uuid4().hex
+    os.makedirs(job_dir(job_id))
+    job = {"id": job_id, "filename": filename, "collection": collection,
+           "status": "queued", "stage": 0, "stages": len(STAGES) - 1,
+           "progress": {"done": 0, "total": 0}, "chunks": None,
+           "index_version": None, "error": None, "pid": None, "api_pid": os.getpid(),
+           "created": time.time(), "started": None, "finished": None}
+    write_job(job)
+    return job
+
+
+# ---------------- WORKER PROCESS ----------------
+def _init_worker():
+    """
+    Runs once in every worker process: lower priority + CPU cap.
+    This only deprioritises the worker's own CPU work (PDF parsing, chunking);
+    embeddings are computed by Ollama, which the API shares → the worker's share
+    is capped by INGEST_EMBED_CONCURRENCY and the API's calls by its embed_gate.
+    """
+    if hasattr(os, "nice"):
+        os.nice(settings.INGEST_NICE)
+    if settings.INGEST_CPUS and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, settings.INGEST_CPUS)
+    # numeric libraries (torch / BLAS under nltk, PyMuPDF) → few threads
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(settings.INGEST_CPU_THREADS)
+
+
+def _copy_index(src: str, dst: str):
+    """Copy one Chroma index (sqlite + segment dirs + chunk store) — never sibling collections."""
+    from rag.chunk_store import STORE_DIR
+
+    shutil.copy2(os.path.join(src, "chroma.sqlite3"), os.path.join(dst, "chroma.sqlite3"))
+    for name in os.listdir(src):
+        if (UUID_DIR.match(name) or name == STORE_DIR) \
+                and os.path.isdir(os.path.join(src, name)):
+            shutil.copytree(os.path.join(src, name), os.path.join(dst, name))
+
+
+def _backfill_source(vectordb) -> int:
+    """
+    Chunks stored without a `source` would survive the delete-by-source of a
+    re-upload and be duplicated → recover it from the chunk id, or refuse the
+    job if some chunk has neither. Returns the number of chunks fixed.
+    """
+    col = vectordb._collection
+    ids, metas, unknown = [], [], 0
+    offset = 0
+    while True:
+        page = col.get(include=["metadatas"], limit=PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        for cid, meta in zip(page["ids"], page["metadatas"]):
+            if (meta or {}).get("source"):
+                continue
+            m = CHUNK_ID.match(cid)
+            if m is None:
+                unknown += 1
+                continue
+            ids.append(cid)
+            metas.append({**(meta or {}), "source": m.group(1)})
+        offset += len(page["ids"])
+    if unknown:
+        raise ValueError(f"{unknown} chunks in the live index have no source — rebuild "
+                         f"the collection with scripts.build_chroma_db before uploading")
+    for i in range(0, len(ids), PAGE_SIZE):
+        col.update(ids=ids[i:i + PAGE_SIZE], metadatas=metas[i:i + PAGE_SIZE])
+    return len(ids)
+
+
+def run_job(job_id: str) -> dict:
+    """parse → chunk → keywords → embed into a copy of the live index → publish."""
+    from app_logging.parse_logger import parse_logger
+
+    job = read_job(job_id)
+    pdf_path = os.path.join(job_dir(job_id), job["filename"])
+    collection = job["collection"]
+
+    def stage(name, **fields):
+        job.update(status=name, stage=STAGES.index(name), **fields)
+        write_job(job)
+        parse_logger.info(f"Ingest job {job_id} → {name}")
+
+    job.update(pid=os.getpid(), started=time.time())
+    vdir, published = None, False
+    try:
+        # heavy imports stay in the worker process
+        from ingestion.pdf_parser import parse_pdf
+        from ingestion.chunker import chunk_blocks
+        from embeddings.embedder import embed_chunks, open_collection, write_manifest_for
+        from rag.manifest import (collection_dir, ingest_lock, new_version_dir,
+                                  publish_version)
+        from rag.chunk_store import write_chunk_store
+
+        stage("parsing")
+        blocks = parse_pdf(pdf_path)
+
+        stage("chunking")
+        chunks = chunk_blocks(blocks, pdf_path)
+        if not chunks:
+            raise ValueError("no text found in the PDF")
+
+        stage("keywords")
+        try:
+            from ingestion.keyword_extractor import extract_keywords
+            chunks = extract_keywords(chunks)
+        except ImportError:
+            parse_logger.warning("Keyword extractor not available — skipping keywords.")
+
+        # one ingest per collection at a time (across processes): each starts
+        # from the version the previous one published
+        with ingest_lock(collection):
+            stage("embedding", progress={"done": 0, "total": len(chunks)}, chunks=len(chunks))
+            version, vdir = new_version_dir(collection)
+            live = collection_dir(collection)
+            if live is not None:
+                _copy_index(live, vdir)   # existing vectors are reused, not re-embedded
+
+            vectordb = open_collection(vdir, collection)
+            source = chunks[0].get("source")
+            if source and live is not None:
+                fixed = _backfill_source(vectordb)
+                if fixed:
+                    parse_logger.info(f"Ingest job {job_id} → source recovered for {fixed} chunks")
+                vectordb._collection.delete(where={"source": source})  # re-upload replaces
+
+            def progress(done, total, _):
+                job["progress"] = {"done": done, "total": total}
+                write_job(job)
+
+            embed_chunks(vectordb, chunks, workers=settings.INGEST_EMBED_CONCURRENCY,
+                         progress=progress)
+
+            stage("publishing")
+            write_chunk_store(vdir, chunks)
+            write_manifest_for(vectordb, vdir, collection, index_version=version)
+            publish_version(collection, version)
+            published = True
+
+        stage("done", index_version=version, finished=time.time())
+    except Exception as e:
+        parse_logger.error(f"Ingest job {job_id} failed: {e}")
+        job.update(status="failed", error=str(e), finished=time.time())
+        write_job(job)
+        if vdir and not published:
+            shutil.rmtree(vdir, ignore_errors=True)
+    return job
+
+
+# ---------------- QUEUE (API side) ----------------
+class IngestQueue:
+    """
+    Low-priority worker processes for ingest jobs (at most INGEST_WORKERS at once,
+    the rest wait). `on_done(job)` runs in the API process when a job finishes.
+    """
+
+    def __init__(self, on_done=None):
+        self.on_done = on_done
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.INGEST_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker)
+            return self._executor
+
+    def submit(self, job: dict):
+        future = self._pool().submit(run_job, job["id"])
+        if self.on_done is not None:
+            future.add_done_callback(lambda f: self.on_done(read_job(job["id"])))
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,215 @@
+# rag/batch.py
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from rag.pipeline import (MSG_NEED_DETAILS, MSG_NO_SECTIONS, MSG_NOTHING_USEFUL,
+                          MSG_WEAK_CONTEXT, _degraded, build_prompt, context_texts,
+                          log_generation, safe_log, select_chapters)
+from rag.ollama_client import (CircuitOpenError, OverloadedError, backend_down, generate,
+                               get_embeddings)
+from app_logging.query_logger import query_logger
+from config.settings import settings
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _embed_all(texts: List[str]) -> np.ndarray:
+    """Embed in batched calls of BATCH_EMBED_SIZE texts each."""
+    vecs = []
+    for part in _chunks(texts, settings.BATCH_EMBED_SIZE):
+        vecs.extend(get_embeddings().embed_documents(part))
+    return np.asarray(vecs, dtype=np.float32)
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return np.sum(a * b, axis=1)
+
+
+def _retrieve_grouped(db, query_vecs: np.ndarray, chapters_per_query: List[list], k=2):
+    """
+    ONE Chroma query per chapter, carrying every query routed to that chapter,
+    instead of one query per (question, chapter) pair.
+    """
+    by_chapter = {}
+    for qi, chapters in enumerate(chapters_per_query):
+        for chap in chapters:
+            by_chapter.setdefault(chap, []).append(qi)
+
+    from langchain_core.documents import Document
+
+    docs = [[] for _ in chapters_per_query]
+    for chap, qidx in by_chapter.items():
+        try:
+            res = db._collection.query(
+                query_embeddings=query_vecs[qidx].tolist(), n_results=k,
+                where={"chapter": chap}, include=["documents", "metadatas"])
+        except Exception as e:
+            query_logger.warning(safe_log(f"Failed batch chapter search → {chap} | {e}"))
+            continue
+        for qi, texts, metas in zip(qidx, res["documents"], res["metadatas"]):
+            docs[qi].extend(Document(page_content=t, metadata=m or {})
+                            for t, m in zip(texts, metas))
+    return docs
+
+
+def _generate_with_backoff(prompt: str) -> str:
+    """
+    Batch work yields to interactive traffic: wait out 429s, for at most
+    BATCH_RETRY_MAX_SECONDS (then the error is raised → status "error").
+    """
+    give_up = time.monotonic() + settings.BATCH_RETRY_MAX_SECONDS
+    while True:
+        try:
+            return generate(prompt)
+        except OverloadedError as e:
+            if time.monotonic() + e.retry_after > give_up:
+                raise
+            time.sleep(e.retry_after)
+
+
+def _prepare_block(db, router, items: List[Dict], sim_threshold: float, chunk_store=None):
+    """Everything before generation, vectorised across the block."""
+    queries = [it["query"] for it in items]
+    query_vecs = _embed_all(queries)
+
+    routed = router.top_chapters_batch(query_vecs, top_k=5)
+    chapters_per_query = []
+    for it, scores in zip(items, routed):
+        if not scores:
+            it["response"], it["status"] = MSG_NO_SECTIONS, "no_sections"
+            chapters_per_query.append([])
+            continue
+        valid, _ = select_chapters(scores, sim_threshold)
+        if not valid:
+            it["response"], it["status"] = MSG_NEED_DETAILS, "need_details"
+        it["chapters"] = valid
+        chapters_per_query.append(valid)
+
+    docs = _retrieve_grouped(db, query_vecs, chapters_per_query)
+
+    # contexts for the hallucination check → embedded together as well
+    pending = []
+    for i, (it, found) in enumerate(zip(items, docs)):
+        if "status" in it:
+            continue
+        unique = list({d.page_content: d for d in found}.values())
+        if not unique:
+            it["response"], it["status"] = MSG_NOTHING_USEFUL, "nothing_useful"
+            continue
+        it["context"] = "\n\n".join(context_texts(unique[:3], chunk_store))
+        it["docs"] = unique[:3]
+        pending.append(i)
+
+    if pending:
+        ctx_vecs = _embed_all([items[i]["context"] for i in pending])
+        sims = _cosine_rows(query_vecs[pending], ctx_vecs)
+        for i, sim in zip(pending, sims):
+            if sim < settings.CONTEXT_THRESHOLD:
+                items[i]["response"], items[i]["status"] = MSG_WEAK_CONTEXT, "weak_context"
+
+
+def _finish(it: Dict, batch_start: float) -> Dict:
+    return {
+        "id": it["id"],
+        "query": it["query"],
+        "response": it.get("response"),
+        "status": it.get("status", "ok"),
+        "chapters": it.get("chapters", []),
+        "timings": {
+            "prepare_s": round(it["prepare_s"], 4),
+            "generation_s": round(it.get("generation_s", 0.0), 4),
+            "elapsed_s": round(time.monotonic() - batch_start, 4),
+        },
+    }
+
+
+def answer_batch(db, router, questions: List[Dict], concurrency: int = None,
+                 sim_threshold: float = None, chunk_store=None) -> Iterator[Dict]:
+    """
+    Answer many questions, yielding one result dict per question AS IT COMPLETES.
+    `questions` → [{"id": ..., "query": ...}, ...]
+    `chunk_store` → contexts widened with neighbouring chunks, as in rag_answer.
+    """
+    sim_threshold = sim_threshold or settings.SIM_THRESHOLD
+    concurrency = concurrency or settings.BATCH_GENERATE_CONCURRENCY
+    batch_start = time.monotonic()
+    query_logger.info(f"Batch received → {len(questions)} questions")
+    questions = [{"id": q.get("id", i), "query": q["query"]}
+                 for i, q in enumerate(questions)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for items in _chunks(questions, settings.BATCH_BLOCK_SIZE):
+            t0 = time.monotonic()
+            try:
+                _prepare_block(db, router, items, sim_threshold, chunk_store)
+            except Exception as e:
+                # embedder down / routing failed → this block's open items fail, the batch goes on
+                query_logger.error(safe_log(f"Batch block failed → {len(items)} questions | {e}"))
+                for it in items:
+                    if "status" not in it:
+                        it["response"], it["status"] = str(e), "error"
+            prepare_s = (time.monotonic() - t0) / len(items)  # amortised share
+
+            futures = {}
+            for it in items:
+                it["prepare_s"] = prepare_s
+                if "status" in it:
+                    yield _finish(it, batch_start)
+                    continue
+                futures[pool.submit(_generate_item, it)] = it
+
+            for fut in as_completed(futures):
+                it = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    it["response"], it["status"] = str(e), "error"
+                yield _finish(it, batch_start)
+
+    query_logger.info(
+        f"Batch done → {len(questions)} questions in {time.monotonic() - batch_start:.2f}s")
+
+
+def _generate_item(it: Dict):
+    t0 = time.monotonic()
+    prompt = build_prompt(it["context"], it["query"])
+    try:
+        it["response"] = _generate_with_backoff(prompt)
+    except Exception as e:
+        # open breaker / LLM down → retrieved passages, like /ask
+        if not (isinstance(e, CircuitOpenError) or backend_down(e)):
+            raise
+        it["response"], it["status"] = _degraded(it["docs"], e)["response"], "degraded"
+        it["generation_s"] = time.monotonic() - t0
+        return
+    it["generation_s"] = time.monotonic() - t0
+    log_generation(prompt, it["response"], it["generation_s"])
+
+
+def parse_questions(lines) -> list:
+    """JSONL → [{"id", "query"}]; a line may also be a bare JSON string."""
+    questions = []
+    for n, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {n}: invalid JSON ({e.msg})")
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict) or not str(item.get("query", "")).strip():
+            raise ValueError(f"line {n}: expected an object with a non-empty 'query'")
+        questions.append({"id": item.get("id", n), "query": str(item["query"])})
+    return questions
@@ -0,0 +1,210 @@
+# rag/chunk_store.py
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+STORE_DIR = "chunk_store"
+INDEX_FILE = "index.json"
+MIN_FRAGMENT_CHARS = 80    # a clipped neighbour shorter than this is dropped
+
+
+# ---------------- LAYOUT ----------------
+# <index version>/chunk_store/index.json          → {source: {key, base, count, chapters}}
+# <index version>/chunk_store/<key>.bin           → UTF-8 chunk texts back to back
+# <index version>/chunk_store/<key>.offsets.npy   → int64 (count + 1): text i = bin[o[i]:o[i+1]]
+# <index version>/chunk_store/<key>.chapters.npy  → int32 (count): chapter id, -1 = no chunk
+# row i ↔ chunk_index base + i (chunk_blocks numbers chunks per source)
+def _key(source: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", source)[:60]
+    return f"{safe}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _read_index(root: str) -> dict:
+    try:
+        with open(os.path.join(root, INDEX_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _replace(path: str, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def write_chunk_store(persist_dir: str, chunks: list) -> dict:
+    """
+    Store the chunk texts of every source in `chunks` next to the index.
+    Sources already in the store are kept (ingest jobs add one PDF at a time);
+    a source written again is replaced.
+    """
+    root = os.path.join(persist_dir, STORE_DIR)
+    os.makedirs(root, exist_ok=True)
+    index = _read_index(root)
+
+    by_source = {}
+    for c in chunks:
+        if c.get("chunk_index") is not None:
+            by_source.setdefault(c.get("source", ""), []).append(c)
+
+    for source, items in by_source.items():
+        base = min(c["chunk_index"] for c in items)
+        count = max(c["chunk_index"] for c in items) - base + 1
+        texts = [b""] * count
+        chapter_ids = np.full(count, -1, dtype=np.int32)
+        chapters = {}
+        for c in items:
+            i = c["chunk_index"] - base
+            texts[i] = c["text"].encode("utf-8")
+            chapter_ids[i] = chapters.setdefault(c["chapter"], len(chapters))
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(t) for t in texts])
+
+        key = _key(source)
+        _replace(os.path.join(root, f"{key}.bin"), lambda f: f.write(b"".join(texts)))
+        _replace(os.path.join(root, f"{key}.offsets.npy"), lambda f: np.save(f, offsets))
+        _replace(os.path.join(root, f"{key}.chapters.npy"), lambda f: np.save(f, chapter_ids))
+        index[source] = {"key": key, "base": base, "count": count, "chapters": list(chapters)}
+
+    _replace(os.path.join(root, INDEX_FILE),
+             lambda f: f.write(json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8")))
+    return index
+
+
+# ---------------- READ SIDE (API) ----------------
+class _SourceChunks:
+    def __init__(self, root: str, entry: dict):
+        self.base = entry["base"]
+        self.count = entry["count"]
+        self.offsets = np.load(os.path.join(root, f"{entry['key']}.offsets.npy"), mmap_mode="r")
+        self.chapters = np.load(os.path.join(root, f"{entry['key']}.chapters.npy"), mmap_mode="r")
+        self._file = open(os.path.join(root, f"{entry['key']}.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def text(self, i: int) -> str:
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+
+class ChunkStore:
+    """
+    Chunk texts of one index version, memory-mapped → the previous / next chunk
+    of a hit is two array lookups and a slice (no Chroma round trip).
+    """
+
+    def __init__(self, persist_dir: str):
+        self.root = os.path.join(persist_dir, STORE_DIR)
+        self.index = _read_index(self.root)
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(e["count"] for e in self.index.values())
+
+    def _source(self, source: str) -> Optional[_SourceChunks]:
+        chunks = self._sources.get(source)
+        if chunks is None and source in self.index:
+            with self._lock:
+                chunks = self._sources.get(source)
+                if chunks is None:
+                    chunks = self._sources[source] = _SourceChunks(self.root, self.index[source])
+        return chunks
+
+    def text(self, source: str, chunk_index: int) -> Optional[str]:
+        chunks = self._source(source)
+        if chunks is None:
+            return None
+        i = chunk_index - chunks.base
+        if not 0 <= i < chunks.count or chunks.chapters[i] < 0:
+            return None
+        return chunks.text(i)
+
+    def _walk(self, chunks: _SourceChunks, source: str, i: int, direction: int,
+              limit: int, same_chapter: bool, skip) -> List[str]:
+        """Non-empty chunk texts from row i outwards, until `limit` chars are collected."""
+        texts, size, j = [], 0, i + direction
+        while size < limit and 0 <= j < chunks.count and chunks.chapters[j] >= 0 \
+                and not (same_chapter and chunks.chapters[j] != chunks.chapters[i]) \
+                and (source, chunks.base + j) not in skip:
+            text = chunks.text(j).strip()
+            if text:                      # empty chunks (page breaks) → look further
+                texts.append(text)
+                size += len(text)
+            j += direction
+        return texts
+
+    @staticmethod
+    def _clip(texts: List[str], quota: int, direction: int) -> List[str]:
+        """Keep `quota` chars, nearest to the hit first; the farthest text is cut."""
+        out = []
+        for text in texts:
+            if quota <= 0:
+                break
+            if len(text) > quota:
+                if quota < MIN_FRAGMENT_CHARS:
+                    break
+                text = (text[:quota].rsplit(" ", 1)[0] + " …" if direction > 0
+                        else "… " + text[-quota:].split(" ", 1)[-1])
+            out.append(text)
+            quota -= len(text)
+        return out
+
+    def neighbours(self, source: str, chunk_index: int, budget_tokens: int,
+                   same_chapter: bool = True, skip=()) -> Tuple[List[str], List[str]]:
+        """
+        Chunks around a hit within `budget_tokens` (~4 chars per token): half
+        before, half after, and what one side doesn't need goes to the other.
+        Stops at a chapter boundary (`same_chapter`) and at chunks in `skip`
+        ((source, chunk_index) already in the context).
+        Returns (before, after), both in reading order.
+        """
+        chunks = self._source(source)
+        if chunks is None:
+            return [], []
+        i = chunk_index - chunks.base
+        if not 0 <= i < chunks.count or budget_tokens <= 0:
+            return [], []
+
+        budget = budget_tokens * 4
+        after = self._walk(chunks, source, i, 1, budget, same_chapter, skip)
+        before = self._walk(chunks, source, i, -1, budget, same_chapter, skip)
+        after_len, before_len = sum(map(len, after)), sum(map(len, before))
+
+        after_quota = min(after_len, budget // 2)
+        before_quota = min(before_len, budget // 2)
+        left = budget - after_quota - before_quota
+        extra = min(left, after_len - after_quota)
+        after_quota += extra
+        before_quota += min(left - extra, before_len - before_quota)
+
+        return (self._clip(before, before_quota, -1)[::-1],
+                self._clip(after, after_quota, 1))
+
+    def expand(self, doc, budget_tokens: int, same_chapter: bool = True, skip=()) -> str:
+        """`doc` text with its neighbouring chunks (unchanged if it has no chunk_index)."""
+        meta = doc.metadata or {}
+        if meta.get("chunk_index") is None:
+            return doc.page_content
+        before, after = self.neighbours(meta.get("source", ""), int(meta["chunk_index"]),
+                                        budget_tokens, same_chapter, skip)
+        return "\n".join(before + [doc.page_content] + after)
+
+    def close(self):
+        with self._lock:
+            for chunks in self._sources.values():
+                chunks.close()
+            self._sources = {}
@@ -0,0 +1,49 @@
+# rag/deadline.py
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out during `stage`."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute time budget of one request; every stage draws down the same one."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, stage: str):
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+
+# set per request → Ollama calls made anywhere below (Chroma, router) see it
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    token = _current.set(Deadline(seconds))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
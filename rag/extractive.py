@@ -0,0 +1,77 @@
+# rag/extractive.py
+
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from config.settings import settings
+
+# split after . ! ? when the next sentence starts like one (keeps "e.g. the", "7.0.6")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+
+def split_sentences(text: str) -> List[str]:
+    text = re.sub(r"\s+", " ", text).strip()
+    return [s.strip() for s in SENTENCE_END.split(text)
+            if len(s.split()) >= settings.FAST_PATH_MIN_WORDS]
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    mat = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def citation(doc) -> dict:
+    meta = doc.metadata or {}
+    return {"chapter": meta.get("chapter"), "page": meta.get("page")}
+
+
+def distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """
+    Chroma distance of a hit → cosine similarity to the query.
+    Ollama's /api/embed returns unit vectors, so squared l2 = 2 - 2·cos.
+    """
+    if space in ("cosine", "ip"):
+        return 1.0 - distance
+    return 1.0 - distance / 2.0
+
+
+def extract_answer(query_vec, scored_docs, embedder) -> Optional[dict]:
+    """
+    Fast path for lookups: if the best chunk AND its best sentence(s) are close
+    enough to the query, return those sentences (with chapter/page) instead of
+    generating. `scored_docs` = [(doc, similarity from the retrieval)] → the
+    chunk gate costs nothing; only the sentences of the chunk that passes are embedded.
+    Returns None when confidence is too low → caller generates as usual.
+    """
+    candidates = [(d, score, split_sentences(d.page_content)) for d, score in scored_docs]
+    candidates = [c for c in candidates if c[2]]
+    if not candidates:
+        return None
+
+    doc, chunk_score, sents = max(candidates, key=lambda c: c[1])
+    if chunk_score < settings.FAST_PATH_CHUNK_SIM:
+        return None
+
+    # sentence scores of the best chunk
+    mat = _unit_rows(embedder.embed_documents(sents))
+    sent_sims = mat @ _unit_rows([query_vec])[0]
+    top = np.argsort(-sent_sims)[:settings.FAST_PATH_MAX_SENTENCES]
+    top = sorted(i for i in top if sent_sims[i] >= settings.FAST_PATH_SENTENCE_SIM)
+    if not top:
+        return None
+
+    return {
+        "answer": " ".join(sents[i] for i in top),   # in document order
+        "chunk_score": float(chunk_score),
+        "sentence_score": float(max(sent_sims[i] for i in top)),
+        "citations": [citation(doc)],
+    }
+
+
+def format_answer(extract: dict) -> str:
+    cites = "; ".join(f"{c['chapter']}, p. {c['page']}" for c in extract["citations"])
+    return f"{extract['answer']}\n\n(Source: {cites})"
@@ -0,0 +1,327 @@
+# rag/index_registry.py
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from config.settings import settings
+from rag.chunk_store import ChunkStore
+from rag.manifest import apply_search_ef, collection_dir, load_or_build_manifest
+from rag.metadata_matcher import ChapterRouter
+from rag.ollama_client import get_embeddings
+from rag.query_cache import LRUCache
+
+VALID_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{2,62}$")   # Chroma: 3-63 chars
+
+
+class UnknownCollectionError(Exception):
+    pass
+
+
+# ---------------- PER-COLLECTION METRICS ----------------
+class CollectionMetrics:
+    """Counters + recent latencies; survive the collection being evicted."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.opens = 0
+        self.evictions = 0
+        self.last_used = None
+        self.paths = {}                     # "extractive" / "generated" / "no_answer" → count
+        self.latencies = deque(maxlen=512)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool = True, path: str = None):
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            if path:
+                self.paths[path] = self.paths.get(path, 0) + 1
+            self.latencies.append(seconds)
+            self.last_used = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lat = np.asarray(self.latencies) if self.latencies else None
+            paths = dict(self.paths)
+        answered = paths.get("extractive", 0) + paths.get("generated", 0)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "opens": self.opens,
+            "evictions": self.evictions,
+            "last_used": self.last_used,
+            "paths": paths,
+            # share of answered questions served without the LLM
+            "fast_path_hit_rate": round(paths.get("extractive", 0) / answered, 4)
+            if answered else None,
+            "latency_p50": round(float(np.percentile(lat, 50)), 4) if lat is not None else None,
+            "latency_p95": round(float(np.percentile(lat, 95)), 4) if lat is not None else None,
+        }
+
+
+# ---------------- OPEN COLLECTION ----------------
+class CollectionHandle:
+    """An open collection: Chroma handle + routing + manifest, ref-counted."""
+
+    def __init__(self, name: str, persist_dir: str, db, router, manifest):
+        self.name = name
+        self.persist_dir = persist_dir
+        self.db = db
+        self.router = router
+        self.manifest = manifest
+        self.index_version = manifest["index_version"]
+        self.answers = LRUCache(settings.ANSWER_CACHE_SIZE)   # first-turn answers
+        self.chunks = ChunkStore(persist_dir)                 # neighbour chunks (memory-mapped)
+        self.size_bytes = self._estimate_size()
+        self.refs = 0
+        self.retired = False
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def _estimate_size(self) -> int:
+        """Routing matrix + HNSW graph (vectors + ~2*M links per node)."""
+        count = self.manifest.get("chunk_count") or 0
+        dim = self.manifest.get("dim") or 0
+        m = (self.manifest.get("hnsw") or {}).get("max_neighbors") or settings.HNSW_M
+        hnsw = count * (dim * 4 + 2 * m * 4)
+        return int(self.router.matrix.nbytes + hnsw + 64 * 1024)
+
+    def acquire(self):
+        with self._lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self.refs -= 1
+            close_now = self.retired and self.refs == 0
+        if close_now:
+            self.close()
+
+    def retire(self):
+        """Close once the last in-flight request lets go."""
+        with self._lock:
+            self.retired = True
+            close_now = self.refs == 0
+        if close_now:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        _release_chroma(self.db)
+        self.chunks.close()
+        self.db = None
+        self.router = None
+
+
+# Chroma shares ONE system per persist path: a handle reopened on the same path
+# (evicted / retired while still in use) gets the system the old handle holds.
+# → count the live handles per system and stop it only when the last one closes.
+_system_refs = {}
+_system_refs_lock = threading.Lock()
+
+
+def _open_chroma(name: str, persist_dir: str):
+    from langchain_chroma import Chroma   # heavy (chromadb) → only when a collection opens
+    # under the lock → a release can't stop the system this handle is picking up
+    with _system_refs_lock:
+        db = Chroma(collection_name=name, persist_directory=persist_dir,
+                    embedding_function=get_embeddings())
+        key = db._client._identifier
+        _system_refs[key] = _system_refs.get(key, 0) + 1
+    return db
+
+
+def _release_chroma(db):
+    """Stop the Chroma system behind `db` once no open handle uses it (HNSW leaves memory)."""
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        key = db._client._identifier
+        with _system_refs_lock:
+            left = _system_refs.get(key, 1) - 1
+            if left > 0:
+                _system_refs[key] = left
+                return
+            _system_refs.pop(key, None)
+            system = SharedSystemClient._identifier_to_system.pop(key, None)
+        if system is not None:
+            system.stop()
+    except Exception as e:
+        print(f"[WARN] Could not release Chroma client: {e}")
+
+
+def open_collection(name: str) -> CollectionHandle:
+    persist_dir = collection_dir(name)
+    if persist_dir is None:
+        raise UnknownCollectionError(name)
+
+    db = _open_chroma(name, persist_dir)
+    try:
+        apply_search_ef(db._collection)
+    except Exception as e:
+        print(f"[WARN] Could not set HNSW search ef on '{name}': {e}")
+    manifest = load_or_build_manifest(db, persist_dir, name, get_embeddings())
+    router = ChapterRouter(manifest["chapters"], manifest["vectors"])
+    return CollectionHandle(name, persist_dir, db, router, manifest)
+
+
+# ---------------- LRU BOUNDED BY MEMORY ----------------
+class CollectionRegistry:
+    """
+    Lazily opens collections and keeps the open ones in an LRU bounded by
+    their estimated memory (`max_bytes`), not by how many there are.
+    The most recently used collection is always kept, even if alone it is larger.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or settings.COLLECTION_CACHE_MAX_BYTES
+        self._open = OrderedDict()          # name → CollectionHandle
+        self._metrics = {}                  # name → CollectionMetrics
+        self._lock = threading.Lock()
+        self._opening = {}                  # name → Lock (one open per name)
+        self.reloads = {}                   # name → status of the last hot swap
+
+    def metrics(self, name: str) -> CollectionMetrics:
+        with self._lock:
+            return self._metrics.setdefault(name, CollectionMetrics())
+
+    def acquire(self, name: str = None) -> CollectionHandle:
+        """Return the open collection (ref-count +1) — pair with `handle.release()`."""
+        name = name or settings.CHROMA_COLLECTION
+        if not VALID_NAME.match(name):
+            raise UnknownCollectionError(name)
+
+        with self._lock:
+            handle = self._open.get(name)
+            if handle is not None:
+                self._open.move_to_end(name)
+                return handle.acquire()
+            opening = self._opening.setdefault(name, threading.Lock())
+
+        with opening:
+            with self._lock:
+                handle = self._open.get(name)
+                if handle is not None:
+                    self._open.move_to_end(name)
+                    return handle.acquire()
+
+            handle = open_collection(name)
+            with self._lock:
+                self._metrics.setdefault(name, CollectionMetrics()).opens += 1
+            print(f"[INFO] Opened collection '{name}' (index {handle.index_version}, "
+                  f"~{handle.size_bytes / 1e6:.1f} MB)")
+            return self.install(handle).acquire()
+
+    def install(self, handle: CollectionHandle) -> CollectionHandle:
+        """Put `handle` in the cache (replacing any older one) and evict to fit."""
+        with self._lock:
+            old = self._open.pop(handle.name, None)
+            self._open[handle.name] = handle
+            evicted = self._evict_locked()
+        if old is not None and old is not handle:
+            old.retire()
+        for h in evicted:
+            print(f"[INFO] Evicted collection '{h.name}' (~{h.size_bytes / 1e6:.1f} MB)")
+            h.retire()
+        return handle
+
+    def reload(self, name: str) -> dict:
+        """
+        Hot swap: open the live version of `name` NEXT TO the serving one, then
+        swap it in atomically. Requests already holding the old handle finish
+        on it; it is closed when the last of them releases it.
+        """
+        with self._lock:
+            opening = self._opening.setdefault(name, threading.Lock())
+
+        with opening:
+            current = self.get_open(name)
+            target = collection_dir(name)
+            if target is None:
+                raise UnknownCollectionError(name)
+
+            status = {"collection": name, "started": time.time(), "finished": None,
+                      "from": current.index_version if current else None,
+                      "to": None, "status": "running", "error": None}
+            self.reloads[name] = status
+
+            if current is None:
+                status.update(status="not_loaded", finished=time.time())
+                return status
+            if os.path.abspath(current.persist_dir) == os.path.abspath(target):
+                status.update(status="unchanged", to=current.index_version,
+                              finished=time.time())
+                return status
+
+            try:
+                handle = open_collection(name)
+            except Exception as e:
+                status.update(status="error", error=str(e), finished=time.time())
+                raise
+            self.install(handle)
+            status.update(status="swapped", to=handle.index_version, finished=time.time())
+            print(f"[INFO] Hot-swapped '{name}' {status['from']} → {status['to']}")
+            return status
+
+    def changed_collections(self) -> list:
+        """Open collections whose CURRENT pointer moved since they were opened."""
+        with self._lock:
+            handles = list(self._open.values())
+        changed = []
+        for h in handles:
+            target = collection_dir(h.name)
+            if target and os.path.abspath(target) != os.path.abspath(h.persist_dir):
+                changed.append(h.name)
+        return changed
+
+    def _evict_locked(self):
+        evicted = []
+        while len(self._open) > 1 and self.total_bytes() > self.max_bytes:
+            _, h = self._open.popitem(last=False)
+            self._metrics.setdefault(h.name, CollectionMetrics()).evictions += 1
+            evicted.append(h)
+        return evicted
+
+    def total_bytes(self) -> int:
+        return sum(h.size_bytes for h in self._open.values())
+
+    def get_open(self, name: str):
+        with self._lock:
+            return self._open.get(name)
+
+    def known_collections(self) -> list:
+        """Collections on disk (one sub-directory each, plus the legacy default)."""
+        root = settings.CHROMA_PERSIST_DIR
+        names = set()
+        if os.path.isdir(root):
+            names = {d for d in os.listdir(root)
+                     if VALID_NAME.match(d) and os.path.isdir(os.path.join(root, d))
+                     and collection_dir(d) is not None}
+        if collection_dir(settings.CHROMA_COLLECTION) is not None:
+            names.add(settings.CHROMA_COLLECTION)
+        return sorted(names)
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = {name: {"index_version": h.index_version,
+                             "size_bytes": h.size_bytes,
+                             "in_flight": h.refs,
+                             "chapters": len(h.router) if h.router else 0,
+                             "routing_cache": h.router.cache.stats() if h.router else None,
+                             "answer_cache": h.answers.stats()}
+                      for name, h in self._open.items()}
+            metrics = dict(self._metrics)
+        return {
+            "max_bytes": self.max_bytes,
+            "used_bytes": sum(v["size_bytes"] for v in loaded.values()),
+            "loaded": loaded,
+            "metrics": {name: m.snapshot() for name, m in metrics.items()},
+        }
@@ -0,0 +1,287 @@
+# rag/manifest.py
+
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from config.settings import settings
+
+MANIFEST_FORMAT = 1
+
+
+# ---------------- ON-DISK LAYOUT ----------------
+#   <CHROMA_PERSIST_DIR>/<collection>/CURRENT            → name of the live version
+#   <CHROMA_PERSIST_DIR>/<collection>/versions/<version>/ → chroma.sqlite3 + manifest
+#   <CHROMA_PERSIST_DIR>/<collection>/versions/<version>/RETIRED → mtime = when it stopped being live
+RETIRED = "RETIRED"
+
+
+def collection_root(collection: str) -> str:
+    return os.path.join(settings.CHROMA_PERSIST_DIR, collection)
+
+
+def current_version(collection: str):
+    """Version named by the CURRENT pointer, or None (unversioned layout)."""
+    try:
+        with open(os.path.join(collection_root(collection), "CURRENT"), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def collection_dir(collection: str):
+    """
+    Directory holding the live index of a collection, in order of preference:
+    - `<collection>/versions/<CURRENT>/` (versioned builds)
+    - `<CHROMA_PERSIST_DIR>/<collection>/` (unversioned)
+    - CHROMA_PERSIST_DIR itself for the default collection (original flat layout)
+    None if the collection has not been built.
+    """
+    root = settings.CHROMA_PERSIST_DIR
+    sub = collection_root(collection)
+    version = current_version(collection)
+    if version:
+        vdir = os.path.join(sub, "versions", version)
+        if os.path.isfile(os.path.join(vdir, "chroma.sqlite3")):
+            return vdir
+    if os.path.isfile(os.path.join(sub, "chroma.sqlite3")):
+        return sub
+    if collection == settings.CHROMA_COLLECTION and \
+            os.path.isfile(os.path.join(root, "chroma.sqlite3")):
+        return root
+    return None
+
+
+def new_version_dir(collection: str):
+    """(version, directory) for a fresh build — never touches the live version."""
+    version = datetime.now().strftime("%Y%m%d%H%M%S")
+    path = os.path.join(collection_root(collection), "versions", version)
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(collection_root(collection), "versions", f"{version}-{suffix}")
+    os.makedirs(path)
+    return os.path.basename(path), path
+
+
+def publish_version(collection: str, version: str, keep: int = None):
+    """
+    Atomically point CURRENT at `version`, mark the version it replaces as
+    retired, then prune (see prune_versions).
+    """
+    root = collection_root(collection)
+    previous = current_version(collection)
+    tmp = os.path.join(root, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+
+    if previous and previous != version:
+        retired = os.path.join(root, "versions", previous)
+        if os.path.isdir(retired):
+            with open(os.path.join(retired, RETIRED), "w") as f:
+                f.write(str(time.time()))
+    prune_versions(collection, keep)
+
+
+def _retired_at(vdir: str) -> float:
+    try:
+        return os.path.getmtime(os.path.join(vdir, RETIRED))
+    except FileNotFoundError:
+        return os.path.getmtime(vdir)    # never published / older layout
+
+
+def prune_versions(collection: str, keep: int = None, min_age: float = None) -> list:
+    """
+    Delete versions older than the newest `keep`, but only once they have been
+    retired for `min_age` seconds: a worker that hasn't seen the new CURRENT
+    yet (INDEX_WATCH_INTERVAL) or is still draining requests keeps its files.
+    Returns the deleted versions.
+    """
+    keep = keep or settings.INDEX_KEEP_VERSIONS
+    min_age = settings.INDEX_PRUNE_MIN_AGE if min_age is None else min_age
+    versions_dir = os.path.join(collection_root(collection), "versions")
+    if not os.path.isdir(versions_dir):
+        return []
+    live = current_version(collection)
+    old = sorted(v for v in os.listdir(versions_dir) if v != live)
+    removed = []
+    for v in old[:max(0, len(old) - (keep - 1))]:
+        vdir = os.path.join(versions_dir, v)
+        if time.time() - _retired_at(vdir) < min_age:
+            continue
+        shutil.rmtree(vdir, ignore_errors=True)
+        removed.append(v)
+    return removed
+
+
+# ---------------- HNSW PARAMETERS ----------------
+def hnsw_config(space: str = None, m: int = None, construction_ef: int = None,
+                search_ef: int = None) -> dict:
+    """Chroma collection configuration from settings (arguments override)."""
+    return {"hnsw": {
+        "space": space or settings.HNSW_SPACE,
+        "max_neighbors": m or settings.HNSW_M,
+        "ef_construction": construction_ef or settings.HNSW_CONSTRUCTION_EF,
+        "ef_search": search_ef or settings.HNSW_SEARCH_EF,
+    }}
+
+
+def index_hnsw(collection) -> dict:
+    """HNSW parameters a (chromadb) collection was built with."""
+    hnsw = (collection.configuration or {}).get("hnsw") or {}
+    return {k: hnsw.get(k) for k in ("space", "max_neighbors", "ef_construction", "ef_search")}
+
+
+def apply_search_ef(collection, ef: int = None):
+    """Search ef is not baked into the graph → retune an existing index in place."""
+    ef = ef or settings.HNSW_SEARCH_EF
+    if index_hnsw(collection).get("ef_search") != ef:
+        collection.modify(configuration={"hnsw": {"ef_search": ef}})
+
+
+def manifest_paths(persist_dir: str, collection: str):
+    """(<collection>.manifest.json, <collection>.routing.npy) next to the collection."""
+    return (os.path.join(persist_dir, f"{collection}.manifest.json"),
+            os.path.join(persist_dir, f"{collection}.routing.npy"))
+
+
+def _normalize(vectors) -> np.ndarray:
+    mat = np.asarray(vectors, dtype=np.float32)
+    if mat.size == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def write_manifest(persist_dir: str, collection: str, chapters: list, vectors,
+                   chunk_count: int = None, index_version: str = None,
+                   hnsw: dict = None) -> dict:
+    """
+    Persist the routing state of a collection:
+    - routing.npy → L2-normalised chapter vectors (row i ↔ chapters[i])
+    - manifest.json → chapter list, embedding model, index version, counts
+    Both files are written to a temp name first and swapped in atomically.
+    """
+    json_path, npy_path = manifest_paths(persist_dir, collection)
+    os.makedirs(persist_dir, exist_ok=True)
+
+    matrix = _normalize(vectors)
+    tmp_npy = npy_path + ".tmp.npy"
+    np.save(tmp_npy, matrix)
+    os.replace(tmp_npy, npy_path)
+
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "collection": collection,
+        "index_version": index_version or datetime.now().strftime("%Y%m%d%H%M%S"),
+        "embedding_model": settings.OLLAMA_EMBEDDING_MODEL,
+        "chunk_count": chunk_count,
+        "hnsw": hnsw,
+        "dim": int(matrix.shape[1]) if len(matrix) else 0,
+        "chapters": list(chapters),
+        "routing_vectors": os.path.basename(npy_path),
+        "created_at": time.time(),
+    }
+    tmp_json = json_path + ".tmp"
+    with open(tmp_json, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_json, json_path)
+    return manifest
+
+
+def load_manifest(persist_dir: str, collection: str):
+    """
+    Load a manifest with its routing matrix memory-mapped (read-only).
+    Returns None when missing or built with another embedding model.
+    """
+    json_path, npy_path = manifest_paths(persist_dir, collection)
+    if not (os.path.isfile(json_path) and os.path.isfile(npy_path)):
+        return None
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("embedding_model") != settings.OLLAMA_EMBEDDING_MODEL:
+        print(f"[WARN] Manifest for '{collection}' was built with "
+              f"{manifest.get('embedding_model')} — ignoring it.")
+        return None
+
+    # mmap → pages are shared through the OS page cache, nothing is copied
+    manifest["vectors"] = np.load(npy_path,
+                                  mmap_mode="r" if manifest["chapters"] else None)
+    if len(manifest["vectors"]) != len(manifest["chapters"]):
+        print(f"[WARN] Manifest for '{collection}' is inconsistent — ignoring it.")
+        return None
+    return manifest
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock across PROCESSES (e.g. several API workers starting at once)."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10s → keep waiting
+                    time.sleep(0.1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def ingest_lock(collection: str):
+    """
+    Held while a new version of `collection` is built from the live one or
+    published (API ingest jobs, build_chroma_db) → no publish is lost.
+    """
+    os.makedirs(collection_root(collection), exist_ok=True)
+    return file_lock(os.path.join(collection_root(collection), ".ingest.lock"))
+
+
+def load_or_build_manifest(db, persist_dir: str, collection: str, embedder) -> dict:
+    manifest = load_manifest(persist_dir, collection)
+    if manifest is not None:
+        return manifest
+
+    # only ONE worker builds; the others wait on the lock, then just mmap the result
+    json_path, _ = manifest_paths(persist_dir, collection)
+    with file_lock(json_path + ".lock"):
+        manifest = load_manifest(persist_dir, collection)
+        if manifest is None:
+            print(f"[WARN] No manifest for '{collection}' — building it (one-off).")
+            manifest = build_manifest(db, persist_dir, collection, embedder)
+    return manifest
+
+
+def build_manifest(db, persist_dir: str, collection: str, embedder,
+                   index_version: str = None) -> dict:
+    """
+    Slow path: scan chapter metadata (no documents) and embed chapter names
+    in ONE batched call, then persist the result for the next start.
+    """
+    metadatas = db.get(include=["metadatas"])["metadatas"]
+    chapters = sorted({m["chapter"] for m in metadatas if m and "chapter" in m})
+    vectors = embedder.embed_documents(chapters) if chapters else []
+    write_manifest(persist_dir, collection, chapters, vectors,
+                   chunk_count=len(metadatas), index_version=index_version,
+                   hnsw=index_hnsw(db._collection))
+    return load_manifest(persist_dir, collection)
@@ -1,14 +1,10 @@
 # rag/metadata_matcher.py
 
-import os
 import numpy as np
-from langchain_ollama import OllamaEmbeddings
+from rag.ollama_client import get_embeddings
+from rag.query_cache import LRUCache, normalize_query
 from config.settings import settings
 
-embedder = OllamaEmbeddings(model=settings.OLLAMA_EMBEDDING_MODEL,
-                            base_url=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
-CHAPTER_VECS = {}  # cached once
-
 
 def cosine(a, b):
     a = a / np.linalg.norm(a)
@@ -16,23 +12,79 @@ def cosine(a, b):
     return float(np.dot(a, b))
 
 
+class ChapterRouter:
+    """Chapter names + their L2-normalised vectors as ONE matrix (row i ↔ chapters[i])."""
+
+    def __init__(self, chapters: list, matrix):
+        self.chapters = list(chapters)
+        self.matrix = matrix  # may be a read-only memmap
+        # (query, top_k) → [(chapter, score)]; dies with the router on a hot swap
+        self.cache = LRUCache(settings.ROUTING_CACHE_SIZE)
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def scores(self, query_vec):
+        q = np.asarray(query_vec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        return self.matrix @ q
+
+    def top_chapters(self, query_vec, top_k=3):
+        scores = self.scores(query_vec)
+        top_k = min(top_k, len(scores))
+        idx = np.argpartition(-scores, top_k - 1)[:top_k]
+        idx = idx[np.argsort(-scores[idx])]
+        return [(self.chapters[i], float(scores[i])) for i in idx]
+
+    def top_chapters_batch(self, query_vecs, top_k=3):
+        """Route a whole batch with ONE matrix multiply → list of [(chapter, score)]."""
+        if not len(self.chapters):
+            return [[] for _ in range(len(query_vecs))]
+        q = np.asarray(query_vecs, dtype=np.float32)
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        scores = q @ self.matrix.T                      # (n_queries, n_chapters)
+        top_k = min(top_k, scores.shape[1])
+        idx = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        out = []
+        for row, cols in zip(scores, idx):
+            cols = cols[np.argsort(-row[cols])]
+            out.append([(self.chapters[c], float(row[c])) for c in cols])
+        return out
+
+
+ROUTER = ChapterRouter([], np.zeros((0, 0), dtype=np.float32))  # cached once
+
+
+def load_routing(chapters: list, matrix):
+    """Install precomputed (e.g. memory-mapped manifest) chapter vectors"""
+    global ROUTER
+    ROUTER = ChapterRouter(chapters, matrix)
+
+
 def init_embeddings(chapters: list):
-    """Embed all chapter names ONCE"""
-    global CHAPTER_VECS
-    CHAPTER_VECS = {}
-    for c in chapters:
-        CHAPTER_VECS[c] = embedder.embed_query(c)
+    """Embed all chapter names ONCE (single batched call)"""
+    if not chapters:
+        load_routing([], np.zeros((0, 0), dtype=np.float32))
+        return
+    vecs = np.asarray(get_embeddings().embed_documents(list(chapters)), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    load_routing(chapters, vecs)
 
 
-def detect_top_chapters(query: str, top_k=3, return_scores=False):
-    """Return top-k chapters ranked by similarity"""
-    if not CHAPTER_VECS:
+def detect_top_chapters(query: str, top_k=3, return_scores=False, query_vec=None,
+                        router=None):
+    """Return top-k chapters ranked by similarity (pass `query_vec` to skip re-embedding)"""
+    router = router if router is not None else ROUTER
+    if not len(router):
         return []
 
-    query_vec = embedder.embed_query(query)
-    scores = [(chap, cosine(query_vec, vec))
-              for chap, vec in CHAPTER_VECS.items()]
-    scores.sort(key=lambda x: x[1], reverse=True)
+    key = (normalize_query(query), top_k)
+    scores = router.cache.get(key)
+    if scores is None:
+        if query_vec is None:
+            query_vec = get_embeddings().embed_query(query)
+        scores = router.top_chapters(query_vec, top_k)
+        router.cache.put(key, scores)
     if return_scores:
-        return [(c, s) for c, s in scores[:top_k]]
-    return [c for c, s in scores[:top_k]]  # only the chapter names
+        return scores
+    return [c for c, s in scores]  # only the chapter names
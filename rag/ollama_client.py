@@ -0,0 +1,552 @@
+# rag/ollama_client.py
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List
+
+from config.settings import settings
+from rag.deadline import DeadlineExceeded, current_deadline
+from rag.profiling import span
+
+if TYPE_CHECKING:
+    from ollama import Client
+
+
+class OverloadedError(Exception):
+    """Raised when a gate's wait queue is full → caller should answer 429."""
+
+    def __init__(self, gate: str, retry_after: int):
+        super().__init__(f"{gate} queue is full, retry after {retry_after}s")
+        self.gate = gate
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """Raised while a breaker is open → Ollama looks unhealthy, fail fast (503)."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} backend unavailable, retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# ---------------- ADMISSION CONTROL ----------------
+class AdmissionGate:
+    """
+    Concurrency limit with a bounded wait queue.
+    - At most `max_concurrency` calls run at once.
+    - At most `max_queue` callers wait; anyone beyond that is rejected at once.
+    - Waiting longer than `queue_timeout` seconds is also rejected.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int,
+                 queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.avg_service_time = 1.0  # EWMA, seeds Retry-After estimates
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> int:
+        backlog = (self.waiting + self.active) / max(1, self.max_concurrency)
+        return max(1, int(backlog * self.avg_service_time + 0.5))
+
+    def saturated(self) -> bool:
+        """True when a new caller would be rejected right now."""
+        return self.active >= self.max_concurrency and self.waiting >= self.max_queue
+
+    def _reject(self):
+        self.rejected += 1
+        raise OverloadedError(self.name, self.retry_after())
+
+    def acquire(self, timeout: float = None):
+        """Take a slot, waiting at most min(queue_timeout, timeout) seconds."""
+        wait = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+        with self._cond:
+            if self.saturated():
+                self._reject()
+            self.waiting += 1
+            try:
+                ok = self._cond.wait_for(lambda: self.active < self.max_concurrency,
+                                         timeout=wait)
+            finally:
+                self.waiting -= 1
+            if not ok:
+                self._reject()
+            self.active += 1
+        return time.monotonic()
+
+    def try_acquire(self):
+        """A slot only if one is free right now (never queues) → start time or None."""
+        with self._cond:
+            if self.active >= self.max_concurrency:
+                return None
+            self.active += 1
+        return time.monotonic()
+
+    def release(self, started: float):
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self.active -= 1
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * elapsed
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timeout: float = None):
+        started = self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def stats(self) -> dict:
+        return {"active": self.active, "waiting": self.waiting,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue,
+                "rejected": self.rejected,
+                "avg_service_time": round(self.avg_service_time, 3)}
+
+
+# ---------------- CIRCUIT BREAKER ----------------
+class CircuitBreaker:
+    """
+    closed → calls go through; `failure_threshold` failures in a row → open.
+    open → calls fail at once with CircuitOpenError for `reset_timeout` seconds.
+    half-open → ONE trial call; success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.state == "open" and waited >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(self.name,
+                                   max(1, int(self.reset_timeout - waited + 0.5)))
+
+    def abandon(self):
+        """The call never reached Ollama (e.g. queue full) → no verdict."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._trial_running = "closed", 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+EMBED_HOSTS = settings.OLLAMA_EMBED_HOSTS or settings.OLLAMA_HOSTS
+GENERATE_HOSTS = settings.OLLAMA_GENERATE_HOSTS or settings.OLLAMA_HOSTS
+
+# concurrency limits are per backend → the gates scale with the pool
+embed_gate = AdmissionGate("embedding", settings.OLLAMA_EMBED_CONCURRENCY * len(EMBED_HOSTS),
+                           settings.OLLAMA_EMBED_QUEUE, settings.OLLAMA_QUEUE_TIMEOUT)
+generate_gate = AdmissionGate("generation",
+                              settings.OLLAMA_GENERATE_CONCURRENCY * len(GENERATE_HOSTS),
+                              settings.OLLAMA_GENERATE_QUEUE, settings.OLLAMA_QUEUE_TIMEOUT)
+
+embed_breaker = CircuitBreaker("embedding", settings.OLLAMA_BREAKER_FAILURES,
+                               settings.OLLAMA_BREAKER_RESET)
+generate_breaker = CircuitBreaker("generation", settings.OLLAMA_BREAKER_FAILURES,
+                                  settings.OLLAMA_BREAKER_RESET)
+
+
+# ---------------- SHARED CONNECTION POOLS ----------------
+_clients = {}   # host → Client owning that host's keep-alive pool
+_views = {}     # (host, timeout) → Client over the same pool
+_clients_lock = threading.Lock()
+
+
+class _Timed:
+    """The httpx pool of a host, every request made through it bounded by `timeout`."""
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.pool.request(*args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.pool.stream(*args, **kwargs)
+
+
+def get_client(host: str = None, timeout: float = None) -> "Client":
+    """
+    ONE keep-alive HTTP pool per Ollama host, shared by every caller.
+    `timeout` bounds each HTTP read of the returned client's requests → a stuck
+    model load can't hold a thread forever; embed, chat and health checks pass
+    different timeouts but reuse the same connections.
+    """
+    host = host or settings.OLLAMA_HOST
+    key = (host, timeout)
+    client = _views.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _views.get(key)
+            if client is None:
+                # ollama + httpx load on the first call, not on import (CLI startup)
+                import copy
+
+                import httpx
+                from ollama import Client
+
+                base = _clients.get(host)
+                if base is None:
+                    limits = httpx.Limits(
+                        max_connections=settings.OLLAMA_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.OLLAMA_POOL_MAX_CONNECTIONS,
+                        keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY)
+                    base = Client(host=host, limits=limits,
+                                  timeout=httpx.Timeout(None, connect=settings.OLLAMA_CONNECT_TIMEOUT))
+                    _clients[host] = base
+                client = copy.copy(base)
+                client._client = _Timed(base._client, httpx.Timeout(
+                    timeout, connect=settings.OLLAMA_CONNECT_TIMEOUT))
+                _views[key] = client
+    return client
+
+
+def backend_down(error: Exception) -> bool:
+    """Connection refused / reset / timed out → the backend, not the request, is bad."""
+    import httpx
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+
+# ---------------- BACKEND POOLS ----------------
+class Backend:
+    def __init__(self, host: str):
+        self.host = host
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def stats(self) -> dict:
+        return {"host": self.host, "healthy": self.healthy, "outstanding": self.outstanding,
+                "requests": self.requests, "failures": self.failures,
+                "last_error": self.last_error}
+
+
+class BackendPool:
+    """
+    Ollama hosts serving the same models.
+    - Each call goes to the healthy backend with the fewest requests in flight.
+    - A backend whose call fails to connect / times out leaves the rotation at
+      once; the health check (client.ps() → GET /api/ps every OLLAMA_HEALTH_INTERVAL
+      seconds) puts it back when it answers again.
+    """
+
+    def __init__(self, name: str, hosts: List[str], timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self.backends = [Backend(h) for h in hosts]
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._checker = None
+
+    def pick(self, exclude=(), healthy_only: bool = False):
+        """Least outstanding requests first (None if nothing is left to try)."""
+        self._start_health_checks()
+        with self._lock:
+            left = [b for b in self.backends if b not in exclude]
+            candidates = [b for b in left if b.healthy]
+            if not candidates and not healthy_only:
+                candidates = left  # all marked down → still try rather than fail
+            if not candidates:
+                return None
+            best = min(candidates, key=lambda b: (b.outstanding, b.requests))
+            best.outstanding += 1
+            best.requests += 1
+            return best
+
+    def _done(self, backend: Backend, error: Exception = None):
+        with self._lock:
+            backend.outstanding -= 1
+            if error is not None:
+                backend.failures += 1
+                backend.last_error = str(error)[:200]
+                if backend_down(error) and backend.healthy:
+                    backend.healthy = False
+                    print(f"[WARN] Ollama {self.name} backend {backend.host} "
+                          f"out of rotation: {error}")
+
+    def run_on(self, backend: Backend, fn):
+        """fn(client) on `backend` (already counted as outstanding by pick)."""
+        try:
+            with span("http", host=backend.host):
+                result = fn(get_client(backend.host, self.timeout))
+        except Exception as e:
+            self._done(backend, e)
+            raise
+        self._done(backend)
+        return result
+
+    def run(self, fn):
+        """fn(client) on the least loaded backend, failing over once if it is down."""
+        backend = self.pick()
+        try:
+            return self.run_on(backend, fn)
+        except Exception as e:
+            other = self.pick(exclude={backend}) if backend_down(e) else None
+            if other is None:
+                raise
+            return self.run_on(other, fn)
+
+    def broadcast(self, fn) -> dict:
+        """fn(client) on EVERY backend (e.g. preloading models) → {host: result | error}."""
+        out = {}
+        for backend in self.backends:
+            with self._lock:
+                backend.outstanding += 1
+                backend.requests += 1
+            try:
+                out[backend.host] = self.run_on(backend, fn)
+            except Exception as e:
+                out[backend.host] = e
+        return out
+
+    def run_hedged(self, fn, hedge_after: float, gate: AdmissionGate = None):
+        """
+        Like run(), but if the first backend hasn't answered within `hedge_after`
+        seconds, send the same call to a second healthy one and take whichever
+        answers first (the slower call still completes in the background).
+        The hedge takes a second slot of `gate` (no hedge if none is free), held
+        until BOTH calls have finished → the gate counts the losing call too.
+        """
+        first_backend = self.pick()
+        first = _hedge_executor.submit(contextvars.copy_context().run,
+                                       self.run_on, first_backend, fn)
+        try:
+            return first.result(timeout=hedge_after)
+        except FutureTimeout:
+            pass
+        except Exception as e:
+            if not backend_down(e):
+                raise
+            return self.run(fn)
+
+        second_backend = self.pick(exclude={first_backend}, healthy_only=True)
+        if second_backend is None:
+            return first.result()
+        started = gate.try_acquire() if gate is not None else None
+        if gate is not None and started is None:
+            return first.result()
+        with self._lock:
+            self.hedges += 1
+        second = _hedge_executor.submit(contextvars.copy_context().run,
+                                        self.run_on, second_backend, fn)
+        if gate is not None:
+            # released once the second AND then the first call are done
+            second.add_done_callback(
+                lambda _: first.add_done_callback(lambda _: gate.release(started)))
+
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is second:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return f.result()
+                error = error or f.exception()
+        raise error
+
+    def _start_health_checks(self):
+        if self._checker is not None or len(self.backends) < 2 \
+                or settings.OLLAMA_HEALTH_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._checker is None:
+                self._checker = threading.Thread(target=self._health_loop,
+                                                 name=f"ollama-health-{self.name}",
+                                                 daemon=True)
+                self._checker.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(settings.OLLAMA_HEALTH_INTERVAL)
+            self.check_health()
+
+    def check_health(self):
+        for b in self.backends:
+            try:
+                get_client(b.host, settings.OLLAMA_CONNECT_TIMEOUT).ps()
+                ok = True
+            except Exception:
+                ok = False
+            with self._lock:
+                changed = ok != b.healthy
+                b.healthy = ok
+            if changed:
+                print(f"[INFO] Ollama {self.name} backend {b.host} "
+                      f"{'back in rotation' if ok else 'failed health check'}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backends": [b.stats() for b in self.backends],
+                    "hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+
+embed_pool = BackendPool("embedding", EMBED_HOSTS, settings.OLLAMA_EMBED_TIMEOUT)
+generate_pool = BackendPool("generation", GENERATE_HOSTS, settings.OLLAMA_GENERATE_TIMEOUT)
+
+# hedged embedding calls (primary + backup)
+_hedge_executor = ThreadPoolExecutor(max_workers=2 * embed_gate.max_concurrency,
+                                     thread_name_prefix="ollama-hedge")
+
+
+# ---------------- BOUNDED CALLS ----------------
+# calls made under a request deadline run here, so the caller can stop waiting
+# while the HTTP call finishes (within its own timeout) and frees its gate slot
+_executor = ThreadPoolExecutor(
+    max_workers=embed_gate.max_concurrency + generate_gate.max_concurrency,
+    thread_name_prefix="ollama-call")
+
+
+def _settle(breaker: CircuitBreaker, gate: AdmissionGate, started: float, future):
+    gate.release(started)
+    if future.exception() is None:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+def call_bounded(gate: AdmissionGate, breaker: CircuitBreaker, stage: str, fn):
+    """
+    Run `fn` (one Ollama HTTP call) behind the breaker and the gate, within the
+    current request deadline if there is one.
+    Raises CircuitOpenError, OverloadedError or DeadlineExceeded.
+    """
+    with span(f"ollama.{stage}"):
+        return _call_bounded(gate, breaker, stage, fn)
+
+
+def _call_bounded(gate: AdmissionGate, breaker: CircuitBreaker, stage: str, fn):
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check(stage)
+    breaker.before_call()
+
+    try:
+        with span("queue", gate=gate.name):
+            started = gate.acquire(deadline.remaining() if deadline else None)
+    except OverloadedError:
+        breaker.abandon()  # a queue full of work is not an Ollama failure
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(stage)
+        raise
+
+    if deadline is None:
+        try:
+            result = fn()
+        except Exception:
+            breaker.record_failure()
+            raise
+        finally:
+            gate.release(started)
+        breaker.record_success()
+        return result
+
+    # the worker thread carries the request's context (profile spans)
+    future = _executor.submit(contextvars.copy_context().run, fn)
+    future.add_done_callback(lambda f: _settle(breaker, gate, started, f))
+    try:
+        return future.result(timeout=deadline.remaining())
+    except FutureTimeout:
+        raise DeadlineExceeded(stage)
+
+
+class PooledEmbeddings:
+    """
+    LangChain embeddings interface (embed_documents / embed_query, all Chroma calls)
+    backed by the embedding backends + embedding gate. Not subclassing
+    langchain_core's Embeddings keeps langchain/langsmith out of every import.
+    """
+
+    def __init__(self, model: str = None, pool: BackendPool = None):
+        self.model = model or settings.OLLAMA_EMBEDDING_MODEL
+        self.pool = pool or embed_pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        def call(client):
+            return list(client.embed(self.model, texts).embeddings)
+
+        hedge_after = settings.OLLAMA_EMBED_HEDGE_AFTER
+        if hedge_after > 0 and len(self.pool.backends) > 1:
+            return call_bounded(embed_gate, embed_breaker, "embedding",
+                                lambda: self.pool.run_hedged(call, hedge_after, embed_gate))
+        return call_bounded(embed_gate, embed_breaker, "embedding",
+                            lambda: self.pool.run(call))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+_embeddings = None
+
+
+def get_embeddings() -> PooledEmbeddings:
+    """Process-wide embeddings object (for Chroma and the chapter router)."""
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = PooledEmbeddings()
+    return _embeddings
+
+
+def generate(prompt: str, model: str = None) -> str:
+    """Single-turn chat completion on the generation backends + generation gate."""
+    response = call_bounded(
+        generate_gate, generate_breaker, "generation",
+        lambda: generate_pool.run(
+            lambda client: client.chat(model=model or settings.LLM_MODEL,
+                                       messages=[{"role": "user", "content": prompt}])))
+    return response.message.content
+
+
+def gate_stats() -> dict:
+    return {"embedding": {**embed_gate.stats(), "circuit": embed_breaker.stats(),
+                          **embed_pool.stats()},
+            "generation": {**generate_gate.stats(), "circuit": generate_breaker.stats(),
+                           **generate_pool.stats()}}
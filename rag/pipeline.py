@@ -1,12 +1,17 @@
 # rag/pipeline.py
 
-import os
 import time
 from rag.metadata_matcher import detect_top_chapters, cosine
-from langchain_ollama import ChatOllama
+from rag.ollama_client import CircuitOpenError, OverloadedError, backend_down, generate
+from rag.deadline import DeadlineExceeded, current_deadline
+from rag.extractive import citation, distance_to_similarity, extract_answer, format_answer
+from rag.manifest import index_hnsw
+from rag.query_cache import embed_query_cached, normalize_query
+from rag.profiling import annotate, span
 
 from app_logging.query_logger import query_logger
 from app_logging.llm_logger import llm_logger
+from app_logging.config import payload_sampled
 
 from config.settings import settings
 
@@ -17,130 +22,332 @@ def safe_log(msg: str):
     return msg.encode("ascii", errors="ignore").decode("ascii")
 
 
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Cheap token budget (~4 chars per token) — no tokenizer round trip."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+# ---------------- SHARED STEPS (also used by rag/batch.py) ----------------
+MSG_NO_SECTIONS = "I couldn't analyze any relevant sections. Please rephrase."
+MSG_NEED_DETAILS = "I need more specific details to search relevant sections."
+MSG_NOTHING_USEFUL = "I found some sections, but nothing useful. Try rephrasing."
+MSG_WEAK_CONTEXT = (
+    "I found some related parts, but the relevance seems weak.\n"
+    "Could you please clarify or provide more details?"
+)
+MSG_DEGRADED = (
+    "The answer generator is unavailable right now. "
+    "These passages from the manual look relevant:"
+)
+
+
+def select_chapters(chapters_scores, sim_threshold):
+    """KEEP CHAPTERS CLOSE TO BEST (and above the absolute threshold)."""
+    max_score = max(s for _, s in chapters_scores)
+    threshold_ratio = 0.85  # KEEP THIS — no change
+
+    return [
+        chap for chap, s in chapters_scores
+        if s >= max_score * threshold_ratio and s >= sim_threshold
+    ], max_score
+
+
+def build_prompt(context: str, query: str) -> str:
+    return f"""
+You are a customer support technical expert.
+Answer STRICTLY using only the provided context.
+If the information is incomplete → ask a follow-up question.
+Do NOT hallucinate. Do NOT use outside knowledge.
+
+-------------------------
+CONTEXT:
+{context}
+-------------------------
+
+USER QUESTION:
+{query}
+
+ANSWER:
+"""
+
+
+def context_texts(docs, chunk_store=None) -> list:
+    """Texts of the context docs, each widened with its neighbouring chunks."""
+    if chunk_store is None or settings.CONTEXT_NEIGHBOR_TOKENS <= 0:
+        return [d.page_content for d in docs]
+    hits = {(d.metadata.get("source", ""), d.metadata.get("chunk_index")) for d in docs}
+    return [chunk_store.expand(d, settings.CONTEXT_NEIGHBOR_TOKENS,
+                               settings.CONTEXT_NEIGHBOR_SAME_CHAPTER, skip=hits)
+            for d in docs]
+
+
+def log_generation(prompt: str, response_text: str, seconds: float):
+    # full payloads only for a sampled share of requests (constant overhead)
+    if payload_sampled():
+        llm_logger.info(safe_log(f"PROMPT SENT → {prompt[:400]}"))
+        llm_logger.info(safe_log(f"LLM REPLY → {response_text}"))
+    llm_logger.info(f"Reply length = {len(response_text)} chars")
+    llm_logger.info(f"Response Time = {seconds:.4f}s")
+
+
 # ---------------- SMART HALLUCINATION CHECK ----------------
-def context_is_relevant(query, context, embed_fn, min_sim=None):
+def context_is_relevant(query, context, embed_fn, min_sim=None, q_vec=None):
     """Semantic similarity check (better than overlap)."""
     # ❗ Use default from settings if not provided
     min_sim = min_sim or settings.CONTEXT_THRESHOLD
 
-    q_vec = embed_fn(query)
+    if q_vec is None:
+        q_vec = embed_fn(query)
     ctx_vec = embed_fn(context)
     sim = cosine(q_vec, ctx_vec)
     return sim >= min_sim, sim
 
 
 # ---------------- RAG PIPELINE ----------------
-def rag_query(db, query: str, prev_answer=None, sim_threshold=None):
+def rag_query(db, query: str, prev_answer=None, sim_threshold=None, session=None,
+              router=None, chunk_store=None) -> str:
+    return rag_answer(db, query, prev_answer=prev_answer, sim_threshold=sim_threshold,
+                      session=session, router=router, chunk_store=chunk_store)["response"]
+
+
+def _result(response: str, path: str, citations=None) -> dict:
+    unique = {(c["chapter"], c["page"]): c for c in citations or []}
+    return {"response": response, "path": path, "citations": list(unique.values())}
+
+
+def _degraded(docs, reason) -> dict:
+    """No generation budget left / LLM down → hand back the retrieved passages."""
+    query_logger.warning(safe_log(f"Degraded answer → {reason}"))
+    passages = [f"[{d.metadata.get('chapter')}, p. {d.metadata.get('page')}]\n"
+                f"{clip_to_tokens(d.page_content, 120)}" for d in docs[:3]]
+    return _result(MSG_DEGRADED + "\n\n" + "\n\n".join(passages), "degraded",
+                   [citation(d) for d in docs[:3]])
+
+
+def rag_answer(db, query: str, prev_answer=None, sim_threshold=None, session=None,
+               router=None, full: bool = False, answer_cache=None,
+               warmup: bool = False, chunk_store=None) -> dict:
+    """
+    Answer `query` → {"response", "path", "citations"}.
+    path: "extractive" (sentences from the top chunk, no LLM), "generated",
+    "degraded" (retrieved passages: LLM unavailable or out of time),
+    or "no_answer" (routing / retrieval / context check gave up).
+    `full=True` skips the extractive fast path.
+    `answer_cache` (LRUCache of the open index) → first-turn answers are reused.
+    `chunk_store` (ChunkStore of the open index) → context docs are widened with
+    their previous / next chunks (CONTEXT_NEIGHBOR_TOKENS).
+    """
     total_start = time.time()
-    query_logger.info(safe_log(f"Query received → {query}"))
+    # warm-up replays are logged differently → they don't count as traffic when mining logs
+    query_logger.info(safe_log(f"{'Warm-up query' if warmup else 'Query received'} → {query}"))
 
     # ❗ Use config threshold if none provided
     sim_threshold = sim_threshold or settings.SIM_THRESHOLD
 
-    # 🧠 INCLUDE CONTEXT FROM PREVIOUS ANSWERS (FOLLOW-UP QUESTIONS SUPPORT)
-    prev_context = f"PREVIOUS ANSWER:\n{prev_answer}\n\n" if prev_answer else ""
+    # embed ONCE → reused for routing, retrieval and the context check
+    with span("embed_query"):
+        query_vec = embed_query_cached(db._embedding_function, query)
+    # what retrieval searches with → the previous question for vague follow-ups
+    anchor, search_vec = query, query_vec
+
+    # 🧠 FOLLOW-UP QUESTIONS → compare with the previous turn of the session
+    follow_up = session is not None and session.query_vec is not None
+    turn_sim = cosine(query_vec, session.query_vec) if follow_up else 0.0
+    if follow_up:
+        prev_answer = prev_answer or session.answer
+        query_logger.info(
+            f"Session {session.session_id} turn {session.turns + 1} | "
+            f"similarity to previous = {turn_sim:.3f}")
+
+    # 🧠 INCLUDE CONTEXT FROM PREVIOUS ANSWERS (within token budget)
+    prev_context = ""
+    if prev_answer:
+        prev_answer = clip_to_tokens(prev_answer, settings.SESSION_PREV_ANSWER_TOKENS)
+        prev_context = f"PREVIOUS ANSWER:\n{prev_answer}\n\n"
 
     # ---------------------------------------------------------
     # 1️⃣ SMART CHAPTER MATCHING → KEEP CHAPTERS CLOSE TO BEST
     # ---------------------------------------------------------
     t0 = time.time()
-    chapters_scores = detect_top_chapters(query, top_k=5, return_scores=True)
-    query_logger.info(safe_log(f"Raw chapter scores → {chapters_scores}"))
+    if follow_up and turn_sim >= settings.SESSION_EXTEND_SIM:
+        # close follow-up → same sections, skip routing
+        valid_chapters = session.chapters
+        query_logger.info(safe_log(f"Reusing session chapters → {valid_chapters}"))
+    else:
+        with span("routing", top_k=5):
+            chapters_scores = detect_top_chapters(query, top_k=5, return_scores=True,
+                                                  query_vec=query_vec, router=router)
+        query_logger.info(safe_log(f"Raw chapter scores → {chapters_scores}"))
+
+        if not chapters_scores:
+            return _result(MSG_NO_SECTIONS, "no_answer")
+
+        valid_chapters, max_score = select_chapters(chapters_scores, sim_threshold)
+
+        query_logger.info(safe_log(f"max_score = {max_score:.3f}"))
+        query_logger.info(safe_log(f"Chapters kept → {valid_chapters}"))
+
+        if not valid_chapters and follow_up and session.chapters:
+            # vague follow-up ("and how do I undo that?") → stay in previous sections
+            # and search them with the previous question, this one says too little
+            valid_chapters = session.chapters
+            if session.query is not None:
+                anchor, search_vec = session.query, session.query_vec
+            query_logger.info(safe_log(f"Vague follow-up → session chapters {valid_chapters} | "
+                                       f"searching with previous query → {anchor}"))
 
-    if not chapters_scores:
-        return "I couldn't analyze any relevant sections. Please rephrase."
-
-    max_score = max(s for _, s in chapters_scores)
-    threshold_ratio = 0.85  # KEEP THIS — no change
-
-    valid_chapters = [
-        chap for chap, s in chapters_scores
-        if s >= max_score * threshold_ratio and s >= sim_threshold
-    ]
-
-    query_logger.info(safe_log(f"max_score = {max_score:.3f}"))
-    query_logger.info(safe_log(f"Chapters kept → {valid_chapters}"))
     query_logger.info(f"Chapter match time = {time.time() - t0:.4f}s")
 
     if not valid_chapters:
-        return "I need more specific details to search relevant sections."
+        return _result(MSG_NEED_DETAILS, "no_answer")
 
     # ---------------------------------------------------------
     # 2️⃣ RETRIEVE DOCS (ONLY FROM VALID CHAPTERS, NO GLOBAL)
     # ---------------------------------------------------------
-    docs = []
-    for chap in valid_chapters:
-        try:
-            result = db.similarity_search(query, k=2, filter={"chapter": chap})
-            docs.extend(result)
-            query_logger.info(safe_log(f"Docs from '{chap}' → {len(result)}"))
-        except Exception as e:
-            query_logger.warning(
-                safe_log(f"Failed chapter search → {chap} | {e}")
-            )
+    docs, distances = [], {}      # page_content → Chroma distance of this query's hits
+    reuse_docs = follow_up and turn_sim >= settings.SESSION_REUSE_SIM
+    if reuse_docs:
+        query_logger.info("Near-identical follow-up → reusing previous docs")
+    else:
+        for chap in valid_chapters:
+            try:
+                with span("retrieve", chapter=chap):
+                    result = db.similarity_search_by_vector_with_relevance_scores(
+                        search_vec, k=2, filter={"chapter": chap})
+                    annotate(docs=len(result))
+                docs.extend(d for d, _ in result)
+                distances.update((d.page_content, dist) for d, dist in result)
+                query_logger.info(safe_log(f"Docs from '{chap}' → {len(result)}"))
+            except Exception as e:
+                query_logger.warning(
+                    safe_log(f"Failed chapter search → {chap} | {e}")
+                )
+
+    # new hits first, then what the previous turn already retrieved
+    if follow_up and valid_chapters == session.chapters:
+        docs.extend(session.docs)
 
     unique_docs = list({d.page_content: d for d in docs}.values())
     query_logger.info(safe_log(f"Total unique docs → {len(unique_docs)}"))
 
     if not unique_docs:
-        return "I found some sections, but nothing useful. Try rephrasing."
+        return _result(MSG_NOTHING_USEFUL, "no_answer")
 
     # ---------------------------------------------------------
     # 3️⃣ CONTEXT PREPARATION
     # ---------------------------------------------------------
-    context = prev_context + \
-        "\n\n".join(d.page_content for d in unique_docs[:3])
+    # answers that run over a chunk boundary → add the neighbouring chunks
+    with span("neighbour_expand"):
+        context = prev_context + \
+            "\n\n".join(context_texts(unique_docs[:3], chunk_store))
 
     # 🔍 SEMANTIC HALLUCINATION CHECK (/context threshold from settings)
-    ok, sim = context_is_relevant(
-        query,
-        context,
-        db._embedding_function.embed_query,
-        min_sim=settings.CONTEXT_THRESHOLD
-    )
+    try:
+        with span("context_check"):
+            ok, sim = context_is_relevant(
+                query,
+                context,
+                db._embedding_function.embed_query,
+                min_sim=settings.CONTEXT_THRESHOLD,
+                q_vec=search_vec
+            )
+    except (DeadlineExceeded, CircuitOpenError) as e:
+        return _degraded(unique_docs, e)
+    except Exception as e:
+        if not backend_down(e):
+            raise
+        return _degraded(unique_docs, e)
 
     query_logger.info(safe_log(f"Context similarity score = {sim:.3f}"))
     if not ok:
-        return (
-            "I found some related parts, but the relevance seems weak.\n"
-            "Could you please clarify or provide more details?"
-        )
+        return _result(MSG_WEAK_CONTEXT, "no_answer")
+
+    # ♻️ SAME FIRST-TURN QUESTION ALREADY ANSWERED ON THIS INDEX → no LLM call
+    cache_key = (normalize_query(query), full)
+    if answer_cache is None or prev_context:
+        cache_key = None
+    cached = answer_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        query_logger.info(f"Answer cache hit ({cached['path']})")
+        if session is not None:
+            session.remember(anchor, search_vec, valid_chapters, unique_docs, cached["response"])
+        return dict(cached)
 
     # ---------------------------------------------------------
-    # 4️⃣ FINAL PROMPT FOR LLM
+    # ⚡ EXTRACTIVE FAST PATH → lookups answered by one sentence skip the LLM
     # ---------------------------------------------------------
-    prompt = f"""
-You are a customer support technical expert.
-Answer STRICTLY using only the provided context.
-If the information is incomplete → ask a follow-up question.
-Do NOT hallucinate. Do NOT use outside knowledge.
-
--------------------------
-CONTEXT:
-{context}
--------------------------
-
-USER QUESTION:
-{query}
+    if settings.FAST_PATH_ENABLED and not full:
+        t1 = time.time()
+        try:
+            with span("fast_path"):
+                # chunk gate on the retrieval scores (reused session docs have none)
+                space = index_hnsw(db._collection).get("space")
+                scored = [(d, distance_to_similarity(distances[d.page_content], space))
+                          for d in unique_docs[:3] if d.page_content in distances]
+                extract = extract_answer(search_vec, scored, db._embedding_function)
+        except (DeadlineExceeded, CircuitOpenError, OverloadedError) as e:
+            query_logger.warning(safe_log(f"Fast path skipped → {e}"))
+            extract = None
+        except Exception as e:
+            if not backend_down(e):
+                raise
+            query_logger.warning(safe_log(f"Fast path skipped → {e}"))
+            extract = None
+        if extract is None:
+            query_logger.info(f"Fast path miss ({time.time() - t1:.4f}s)")
+        else:
+            query_logger.info(
+                f"Fast path hit → chunk {extract['chunk_score']:.3f} | "
+                f"sentence {extract['sentence_score']:.3f} ({time.time() - t1:.4f}s)")
+            response_text = format_answer(extract)
+            if session is not None:
+                session.remember(anchor, search_vec, valid_chapters, unique_docs, response_text)
+            query_logger.info(
+                safe_log(f"TOTAL LATENCY = {time.time() - total_start:.4f}s"))
+            result = _result(response_text, "extractive", extract["citations"])
+            if cache_key:
+                answer_cache.put(cache_key, result)
+            return result
 
-ANSWER:
-"""
+    # ---------------------------------------------------------
+    # 4️⃣ FINAL PROMPT FOR LLM
+    # ---------------------------------------------------------
+    with span("prompt_build"):
+        prompt = build_prompt(context, query if anchor == query
+                              else f"{anchor}\nFollow-up: {query}")
 
     # ---------------------------------------------------------
-    # 5️⃣ CALL LLM (✔ model comes from settings)
+    # 5️⃣ CALL LLM (✔ model from settings, shared pool + generation gate)
     # ---------------------------------------------------------
-    t2 = time.time()
-    llm = ChatOllama(model=settings.LLM_MODEL,
-                     base_url=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
-    response = llm.invoke(prompt)
-    response_text = response.content
+    deadline = current_deadline()
+    if deadline is not None and deadline.remaining() < settings.GENERATE_MIN_BUDGET:
+        return _degraded(unique_docs, f"{deadline.remaining():.1f}s left for generation")
 
-    llm_logger.info(safe_log(f"PROMPT SENT → {prompt[:400]}"))
-    llm_logger.info(safe_log(f"LLM REPLY → {response_text}"))
-    llm_logger.info(safe_log(f"Response Time = {time.time() - t2:.4f}s"))
+    t2 = time.time()
+    try:
+        with span("generation", prompt_chars=len(prompt)):
+            response_text = generate(prompt)
+    except (DeadlineExceeded, CircuitOpenError) as e:
+        return _degraded(unique_docs, e)
+    except Exception as e:
+        # LLM down / timed out before the breaker opens → still answer
+        if not backend_down(e):
+            raise
+        return _degraded(unique_docs, e)
+    with span("log_generation"):
+        log_generation(prompt, response_text, time.time() - t2)
 
     query_logger.info(
         safe_log(f"TOTAL LATENCY = {time.time() - total_start:.4f}s")
     )
 
-    return response_text
+    if session is not None:
+        session.remember(anchor, search_vec, valid_chapters, unique_docs, response_text)
+
+    result = _result(response_text, "generated", [citation(d) for d in unique_docs[:3]])
+    if cache_key:
+        answer_cache.put(cache_key, result)
+    return result
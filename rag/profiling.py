@@ -0,0 +1,221 @@
+# rag/profiling.py
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from config.settings import settings
+
+VALID_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ---------------- SPANS ----------------
+class Span:
+    """One timed step of a profiled request (children = nested steps)."""
+
+    __slots__ = ("name", "attrs", "parent", "profile", "children", "start", "end", "thread")
+
+    def __init__(self, name: str, attrs: dict, parent=None, profile=None):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.profile = profile
+        self.children = []
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+
+    def path(self) -> list:
+        names, node = [], self
+        while node is not None:
+            names.append(f"span:{node.name}")
+            node = node.parent
+        return names[::-1]
+
+    def to_dict(self, t0: float) -> dict:
+        end = self.end or time.perf_counter()
+        return {"name": self.name, "start_ms": round((self.start - t0) * 1000, 3),
+                "duration_ms": round((end - self.start) * 1000, 3),
+                "thread": self.thread, "attrs": self.attrs,
+                "children": [c.to_dict(t0) for c in self.children]}
+
+
+# innermost open span of the profiled request (None → profiling is off, spans cost nothing)
+_current: ContextVar[Optional[Span]] = ContextVar("profile_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    profile = parent.profile
+    s = Span(name, attrs, parent, profile)
+    parent.children.append(s)
+    token = _current.set(s)
+    tid = threading.get_ident()
+    outer = profile.active.get(tid)
+    profile.active[tid] = s
+    try:
+        yield s
+    finally:
+        s.end = time.perf_counter()
+        _current.reset(token)
+        if outer is None:
+            profile.active.pop(tid, None)
+        else:
+            profile.active[tid] = outer
+
+
+def annotate(**attrs):
+    """Attach attributes to the current span (no-op when not profiling)."""
+    s = _current.get()
+    if s is not None:
+        s.attrs.update(attrs)
+
+
+# ---------------- SAMPLING PROFILER ----------------
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} " \
+           f"({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profile:
+    """
+    Span tree + wall-clock stack samples of every thread working for one request.
+    Samples are folded ("span:ask;span:generation;frame;frame N") → flamegraph.pl,
+    speedscope, inferno.
+    """
+
+    def __init__(self, name: str, interval_ms: float = None, **meta):
+        self.id = uuid.uuid4().hex
+        self.meta = meta
+        self.created = time.time()
+        self.interval = (interval_ms or settings.PROFILE_INTERVAL_MS) / 1000
+        self.samples = Counter()
+        self.active = {}          # thread id → innermost open span on that thread
+        self.root = Span(name, dict(meta), profile=self)
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop,
+                                         name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid, s in list(self.active.items()):
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.samples[";".join(s.path() + stack[::-1])] += 1
+
+    def start(self):
+        self.active[threading.get_ident()] = self.root
+        self._sampler.start()
+
+    def stop(self):
+        self.root.end = time.perf_counter()
+        self._stop.set()
+        self._sampler.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+    def summary(self) -> dict:
+        return {"id": self.id, "name": self.root.name, "created": self.created,
+                "duration_ms": round(((self.root.end or time.perf_counter())
+                                      - self.root.start) * 1000, 3),
+                "samples": sum(self.samples.values()),
+                "interval_ms": self.interval * 1000, **self.meta}
+
+    def save(self, profile_dir: str = None):
+        profile_dir = profile_dir or settings.PROFILE_DIR
+        os.makedirs(profile_dir, exist_ok=True)
+        with open(os.path.join(profile_dir, f"{self.id}.folded"), "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        with open(os.path.join(profile_dir, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump({**self.summary(), "spans": self.root.to_dict(self.root.start)},
+                      f, indent=2, ensure_ascii=False, default=str)
+        prune_profiles(profile_dir)
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    """Opt in per request (header) or for a sampled share of requests."""
+    if header_value and settings.PROFILE_ALLOW_HEADER:
+        return header_value.strip().lower() not in ("0", "false", "no", "off")
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile_scope(name: str, enabled: bool, **meta):
+    """Profile the enclosed block (yields the Profile, or None when disabled)."""
+    if not enabled:
+        yield None
+        return
+    profile = Profile(name, **meta)
+    token = _current.set(profile.root)
+    profile.start()
+    try:
+        yield profile
+    except BaseException as e:
+        profile.root.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        profile.stop()
+        try:
+            profile.save()
+        except OSError as e:
+            print(f"[WARN] Could not save profile {profile.id}: {e}")
+
+
+# ---------------- STORED PROFILES ----------------
+def prune_profiles(profile_dir: str = None, keep: int = None):
+    profile_dir = profile_dir or settings.PROFILE_DIR
+    keep = settings.PROFILE_KEEP if keep is None else keep
+    names = sorted((f for f in os.listdir(profile_dir) if f.endswith(".json")),
+                   key=lambda f: os.path.getmtime(os.path.join(profile_dir, f)))
+    for f in names[:max(0, len(names) - keep)]:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(profile_dir, f[:-5] + ext))
+            except FileNotFoundError:
+                pass
+
+
+def profile_path(profile_id: str, kind: str = "json", profile_dir: str = None):
+    """Path of a stored profile ("json" span tree / "folded" stacks), None if unknown."""
+    if not VALID_ID.match(profile_id or ""):
+        return None
+    path = os.path.join(profile_dir or settings.PROFILE_DIR, f"{profile_id}.{kind}")
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles(limit: int = 50, profile_dir: str = None) -> list:
+    profile_dir = profile_dir or settings.PROFILE_DIR
+    if not os.path.isdir(profile_dir):
+        return []
+    paths = sorted((os.path.join(profile_dir, f) for f in os.listdir(profile_dir)
+                    if f.endswith(".json")), key=os.path.getmtime, reverse=True)
+    out = []
+    for path in paths[:limit]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        data.pop("spans", None)
+        out.append(data)
+    return out
@@ -0,0 +1,69 @@
+# rag/query_cache.py
+
+import threading
+from collections import OrderedDict
+
+from config.settings import settings
+
+
+def normalize_query(query: str) -> str:
+    """Cache key: case and whitespace don't make a different question."""
+    return " ".join(query.lower().split())
+
+
+class LRUCache:
+    """Small thread-safe LRU with hit/miss counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def peek(self, key):
+        """Value without touching recency or the hit/miss counters."""
+        with self._lock:
+            return self._data.get(key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses}
+
+
+# query text → embedding (same model for every collection)
+embedding_cache = LRUCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def embed_query_cached(embedder, query: str):
+    key = (settings.OLLAMA_EMBEDDING_MODEL, normalize_query(query))
+    vec = embedding_cache.get(key)
+    if vec is None:
+        vec = embedder.embed_query(query)
+        embedding_cache.put(key, vec)
+    return vec
@@ -0,0 +1,104 @@
+# rag/session.py
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from rag.deadline import DeadlineExceeded, current_deadline
+from config.settings import settings
+
+
+@dataclass
+class Session:
+    """State of the previous turn, reused by follow-up questions."""
+    session_id: str
+    collection: Optional[str] = None
+    query: Optional[str] = None
+    query_vec: Optional[list] = None
+    chapters: List[str] = field(default_factory=list)
+    docs: list = field(default_factory=list)
+    answer: Optional[str] = None
+    turns: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @contextmanager
+    def turn(self):
+        """
+        One turn at a time per session: a turn reads the previous one and
+        remembers its own → concurrent requests on one session_id queue here
+        (within the request deadline).
+        """
+        deadline = current_deadline()
+        if not self.lock.acquire(timeout=deadline.remaining() if deadline else -1):
+            raise DeadlineExceeded("session")
+        try:
+            yield self
+        finally:
+            self.lock.release()
+
+    def bind(self, collection: str):
+        """A session follows one collection; switching starts a fresh conversation."""
+        if self.collection != collection:
+            self.collection = collection
+            self.query, self.query_vec, self.answer = None, None, None
+            self.chapters, self.docs = [], []
+
+    def remember(self, query, query_vec, chapters, docs, answer):
+        self.query = query
+        self.query_vec = query_vec
+        self.chapters = list(chapters)
+        self.docs = list(docs)[:settings.SESSION_MAX_DOCS]
+        self.answer = answer
+        self.turns += 1
+
+
+class SessionStore:
+    """
+    Bounded in-memory session store.
+    - Sessions idle longer than `ttl_seconds` are dropped.
+    - At most `max_sessions` are kept (least recently used evicted first).
+    """
+
+    def __init__(self, max_sessions: int = None, ttl_seconds: int = None):
+        self.max_sessions = max_sessions or settings.SESSION_MAX_SESSIONS
+        self.ttl_seconds = ttl_seconds or settings.SESSION_TTL_SECONDS
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # OrderedDict is kept in last-used order → expired ones are at the front
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if now - s.last_used < self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[sid]
+
+    def get_or_create(self, session_id: str = None) -> Session:
+        """
+        The live session `session_id`, or a new one. Ids are only ever issued
+        here: an unknown / expired id gets a fresh server-side id, never adopted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = Session(session_id=uuid.uuid4().hex)
+                self._sessions[session.session_id] = session
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,207 @@
+# rag/warmup.py
+
+import json
+import os
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+from app_logging import reader as log_reader
+from rag.deadline import deadline_scope
+from rag.manifest import file_lock
+from rag.ollama_client import (call_bounded, embed_breaker, embed_gate, embed_pool,
+                               generate_breaker, generate_gate, generate_pool,
+                               get_embeddings)
+from rag.pipeline import rag_answer
+from rag.query_cache import embedding_cache, normalize_query
+from config.settings import settings
+
+WARM_CACHE = "warmup.json"           # in the index version dir, shared by every worker
+WARM_VECTORS = "warmup.vectors.npy"
+
+LOG_FILE_RE = re.compile(r"^(?P<date>\d{4}-\d{2}-\d{2})(\.\d+)?\.log$")
+# written by rag_answer; older logs used "-", and safe_log strips the arrow
+QUERY_RE = re.compile(r"\| QUERY \| Query received(?:\s*→|\s+-)?\s+(?P<query>.+)$")
+
+
+def recent_log_files(log_dir: str = None, days: int = None) -> list:
+    """Log files of the `days` most recent dates that have logs (rotated parts included)."""
+    log_dir = log_dir or settings.LOG_DIR
+    days = days or settings.WARMUP_LOG_DAYS
+    if not os.path.isdir(log_dir):
+        return []
+    files = [(m.group("date"), f) for f in os.listdir(log_dir)
+             if (m := LOG_FILE_RE.match(f))]
+    keep = sorted({d for d, _ in files}, reverse=True)[:days]
+    return [os.path.join(log_dir, f) for d, f in sorted(files) if d in keep]
+
+
+def mine_queries(log_dir: str = None, days: int = None):
+    """
+    Count logged queries (case / whitespace folded).
+    Returns ([(query, count), ...] most frequent first, total queries seen).
+    """
+    counts, latest = Counter(), {}
+    for path in recent_log_files(log_dir, days):
+        for _, _, _, logger, line in log_reader.iter_records(path):
+            if logger != "QUERY":
+                continue
+            m = QUERY_RE.search(line)
+            if m:
+                query = m.group("query").strip()
+                key = normalize_query(query)
+                counts[key] += 1
+                latest[key] = query      # most recent spelling
+    ranked = [(latest[k], c) for k, c in counts.most_common()]
+    return ranked, sum(counts.values())
+
+
+def preload_models(keep_alive: str = None) -> dict:
+    """
+    Ask every backend to load its model now (one tiny embedding / an empty
+    generate) and keep it resident for `keep_alive`.
+    Each call goes through the gate + breaker and gets REQUEST_DEADLINE_SECONDS,
+    so a slow model load can't hold readiness for the full HTTP timeout.
+    """
+    keep_alive = keep_alive or settings.OLLAMA_KEEP_ALIVE
+
+    def bounded(gate, breaker, call):
+        def run(client):
+            with deadline_scope(settings.REQUEST_DEADLINE_SECONDS):
+                return call_bounded(gate, breaker, "preload", lambda: call(client))
+        return run
+
+    calls = {
+        "embedding": (embed_pool, bounded(
+            embed_gate, embed_breaker,
+            lambda c: c.embed(settings.OLLAMA_EMBEDDING_MODEL, ["warm-up"],
+                              keep_alive=keep_alive))),
+        "generation": (generate_pool, bounded(
+            generate_gate, generate_breaker,
+            lambda c: c.generate(model=settings.LLM_MODEL, prompt="",
+                                 keep_alive=keep_alive))),
+    }
+    status = {}
+    for kind, (pool, call) in calls.items():
+        for host, result in pool.broadcast(call).items():
+            status[f"{kind}@{host}"] = f"error: {result}" if isinstance(result, Exception) \
+                else "ok"
+    return status
+
+
+def warm_up(handle, top_n: int = None, answers: int = None, preload: bool = True,
+            log_dir: str = None, days: int = None, save: bool = False) -> dict:
+    """
+    Warm an open collection from historical traffic:
+    1. preload the embedding + LLM models on every backend (keep_alive)
+    2. embed the `top_n` most frequent logged queries → query embedding cache
+    3. route them in one matrix multiply → the collection's routing cache
+    4. optionally answer the `answers` most frequent → the collection's answer cache
+    `save=True` → also write it for the other workers (see warm_up_shared).
+    Returns a report (timings + coverage of logged traffic).
+    """
+    top_n = settings.WARMUP_TOP_QUERIES if top_n is None else top_n
+    answers = settings.WARMUP_ANSWERS if answers is None else answers
+    report = {"collection": handle.name, "index_version": handle.index_version}
+    t0 = time.monotonic()
+
+    if preload:
+        report["preload"] = preload_models()
+    report["preload_seconds"] = round(time.monotonic() - t0, 3)
+
+    t1 = time.monotonic()
+    ranked, total = mine_queries(log_dir, days)
+    top = ranked[:top_n]
+    texts = [q for q, _ in top]
+    report.update(queries_logged=total, distinct_queries=len(ranked),
+                  mine_seconds=round(time.monotonic() - t1, 3))
+
+    t2 = time.monotonic()
+    vecs = []
+    if texts:
+        for i in range(0, len(texts), settings.BATCH_EMBED_SIZE):
+            vecs.extend(get_embeddings().embed_documents(texts[i:i + settings.BATCH_EMBED_SIZE]))
+        _fill_caches(handle, texts, vecs)
+    report["embed_route_seconds"] = round(time.monotonic() - t2, 3)
+
+    t3 = time.monotonic()
+    answered = 0
+    for q in texts[:answers]:
+        try:
+            rag_answer(handle.db, q, router=handle.router, answer_cache=handle.answers,
+                       warmup=True, chunk_store=handle.chunks)
+            answered += 1
+        except Exception as e:
+            print(f"[WARN] Warm-up answer failed for '{q[:60]}': {e}")
+            break
+    report["answer_seconds"] = round(time.monotonic() - t3, 3)
+
+    warmed = sum(c for _, c in top)
+    report.update(
+        warmed_queries=len(top),
+        answered_queries=answered,
+        # share of logged requests whose query is now cached
+        coverage=round(warmed / total, 4) if total else None,
+        answer_coverage=round(sum(c for _, c in top[:answered]) / total, 4) if total else None,
+        seconds=round(time.monotonic() - t0, 3),
+    )
+    if save:
+        _save_warm_cache(handle, texts, vecs, report)
+    return report
+
+
+def _fill_caches(handle, texts: list, vecs):
+    for q, vec in zip(texts, vecs):
+        embedding_cache.put((settings.OLLAMA_EMBEDDING_MODEL, normalize_query(q)), list(vec))
+    for q, scores in zip(texts, handle.router.top_chapters_batch(vecs, top_k=5)):
+        handle.router.cache.put((normalize_query(q), 5), scores)
+
+
+# ---------------- SHARED ACROSS WORKERS ----------------
+def _save_warm_cache(handle, texts: list, vecs, report: dict):
+    """What one worker computed → <version dir>/warmup.* for the other workers."""
+    answers = {}
+    for q in texts:
+        cached = handle.answers.peek((normalize_query(q), False))
+        if cached is not None:
+            answers[q] = cached
+    np.save(os.path.join(handle.persist_dir, WARM_VECTORS),
+            np.asarray(vecs, dtype=np.float32).reshape(len(texts), -1 if texts else 0))
+    tmp = os.path.join(handle.persist_dir, WARM_CACHE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"created": time.time(), "queries": texts, "answers": answers,
+                   "report": report}, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(handle.persist_dir, WARM_CACHE))
+
+
+def load_warm_cache(handle) -> dict:
+    """Fill this worker's caches from the shared file (no Ollama calls); None if stale."""
+    try:
+        with open(os.path.join(handle.persist_dir, WARM_CACHE), "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        vecs = np.load(os.path.join(handle.persist_dir, WARM_VECTORS))
+    except (OSError, ValueError):
+        return None
+    if time.time() - cache["created"] > settings.WARMUP_CACHE_TTL:
+        return None
+    if cache["queries"]:
+        _fill_caches(handle, cache["queries"], vecs)
+    for q, result in cache["answers"].items():
+        handle.answers.put((normalize_query(q), False), result)
+    return {**cache["report"], "source": "shared",
+            "age_seconds": round(time.time() - cache["created"], 1)}
+
+
+def warm_up_shared(handle, preload: bool = True) -> dict:
+    """
+    Startup warm-up done ONCE per index version: the first worker to take the
+    lock warms up (preload + embeddings + answers) and writes the result; the
+    others wait for it and load the file → startup cost doesn't grow with workers.
+    """
+    with file_lock(os.path.join(handle.persist_dir, ".warmup.lock")):
+        report = load_warm_cache(handle)
+        if report is None:
+            report = {**warm_up(handle, preload=preload, save=True), "source": "computed"}
+    return report
@@ -0,0 +1,53 @@
+# scripts/batch_ask.py
+
+import argparse
+import json
+import sys
+import time
+
+from rag.batch import answer_batch, parse_questions
+from rag.index_registry import open_collection
+from config.settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions")
+    parser.add_argument("--input", required=True,
+                        help='JSONL, one {"id": ..., "query": ...} per line')
+    parser.add_argument("--out", default=None, help="Output JSONL (default: stdout)")
+    parser.add_argument("--collection", default=settings.CHROMA_COLLECTION)
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Generations in flight (default: BATCH_GENERATE_CONCURRENCY)")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        questions = parse_questions(f)
+    if not questions:
+        print("[WARN] No questions in input.", file=sys.stderr)
+        return
+
+    handle = open_collection(args.collection)
+    print(f"[INFO] {len(questions)} questions → '{handle.name}' "
+          f"(index {handle.index_version})", file=sys.stderr)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    start, done, statuses = time.monotonic(), 0, {}
+    try:
+        for result in answer_batch(handle.db, handle.router, questions,
+                                   concurrency=args.concurrency,
+                                   chunk_store=handle.chunks):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            done += 1
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        handle.close()
+
+    print(f"[OK] {done} answered in {time.monotonic() - start:.1f}s → {statuses}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
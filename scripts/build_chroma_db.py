@@ -1,22 +1,44 @@
 # scripts/build_chroma_db.py
 
 import argparse
-from embeddings.embedder import build_chroma_db
-from app_logging.embed_logger import embed_logger  # <-- NEW
 from config.settings import settings
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Build ChromaDB")
-    parser.add_argument("--input", required=True)
-    parser.add_argument("--persist", default=settings.CHROMA_PERSIST_DIR)
+    parser.add_argument("--input")
+    parser.add_argument("--collection", default=settings.CHROMA_COLLECTION,
+                        help="Collection name (one per product / manual version)")
+    parser.add_argument("--persist",
+                        help="Build into this directory instead of a new version "
+                             "under data/chroma_db/<collection>/versions/")
     parser.add_argument("--limit", type=int, help="Use only N chunks")
+    parser.add_argument("--manifest-only", action="store_true",
+                        help="Only (re)write the routing manifest of an existing DB")
     args = parser.parse_args()
 
+    # imported after argument parsing → `--help` / usage errors return at once
+    from embeddings.embedder import build_chroma_db, open_collection, write_manifest_for
+    from app_logging.embed_logger import embed_logger  # <-- NEW
+    from rag.manifest import collection_dir
+
+    if args.manifest_only:
+        persist = args.persist or collection_dir(args.collection)
+        if persist is None:
+            parser.error(f"collection '{args.collection}' has not been built")
+        write_manifest_for(open_collection(persist, args.collection),
+                           persist, args.collection)
+        raise SystemExit(0)
+    if not args.input:
+        parser.error("--input is required (unless --manifest-only)")
+
     embed_logger.info(
-        f"Starting ChromaDB build | input={args.input} | persist={args.persist} | limit={args.limit}"
+        f"Starting ChromaDB build | input={args.input} | collection={args.collection} | "
+        f"persist={args.persist} | limit={args.limit}"
     )
 
-    count = build_chroma_db(args.input, args.persist, limit=args.limit)
+    count = build_chroma_db(args.input, args.persist, limit=args.limit,
+                            collection=args.collection)
 
-    embed_logger.info(f"Stored {count} chunks into {args.persist}")
-    print(f"[OK] Stored {count} chunks into {args.persist}")
+    target = args.persist or collection_dir(args.collection)
+    embed_logger.info(f"Stored {count} chunks into {target}")
+    print(f"[OK] Stored {count} chunks into {target}")
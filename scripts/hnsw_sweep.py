@@ -0,0 +1,153 @@
+# scripts/hnsw_sweep.py
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from rag.manifest import collection_dir, hnsw_config
+from rag.ollama_client import get_embeddings
+from config.settings import settings
+
+
+def _ints(text: str):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f))
+               for root, _, files in os.walk(path) for f in files)
+
+
+def load_vectors(collection: str):
+    """Ids + stored embeddings of a built collection (nothing is re-embedded)."""
+    import chromadb
+    persist_dir = collection_dir(collection)
+    if persist_dir is None:
+        raise SystemExit(f"[ERROR] Collection '{collection}' has not been built")
+    client = chromadb.PersistentClient(path=persist_dir)
+    data = client.get_collection(collection).get(include=["embeddings"])
+    return data["ids"], np.asarray(data["embeddings"], dtype=np.float32)
+
+
+def load_queries(path: str, vectors: np.ndarray, sample: int, seed: int):
+    """Embedded questions from a JSONL/text file, or a sample of stored vectors."""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        texts = [json.loads(line)["query"] if line.startswith("{") else line
+                 for line in lines]
+        return np.asarray(get_embeddings().embed_documents(texts), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    idx = rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)
+    return vectors[idx]
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int, space: str):
+    """Brute-force top-k under the same distance the index uses."""
+    if space == "l2":
+        dist = ((queries ** 2).sum(1)[:, None] - 2 * queries @ vectors.T
+                + (vectors ** 2).sum(1)[None, :])
+    elif space == "cosine":
+        qn = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        vn = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        dist = -(qn @ vn.T)
+    else:  # ip
+        dist = -(queries @ vectors.T)
+    return np.argsort(dist, axis=1)[:, :k]
+
+
+def sweep(ids, vectors, queries, spaces, ms, construction_efs, search_efs, k):
+    import chromadb
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    rows = []
+    id_pos = {id_: i for i, id_ in enumerate(ids)}
+    for space, m, efc in itertools.product(spaces, ms, construction_efs):
+        truth = exact_neighbours(vectors, queries, k, space)
+        path = tempfile.mkdtemp(prefix="hnsw_sweep_")
+        try:
+            client = chromadb.PersistentClient(path=path)
+            col = client.create_collection(
+                "sweep", configuration=hnsw_config(space, m, efc, max(search_efs)))
+
+            start = time.perf_counter()
+            for i in range(0, len(ids), 1000):
+                col.add(ids=list(ids[i:i + 1000]), embeddings=vectors[i:i + 1000])
+            build_s = time.perf_counter() - start
+            SharedSystemClient.clear_system_cache()   # flush the index to disk
+            disk = _dir_size(path)
+
+            for ef in search_efs:
+                # search ef is read when the index is loaded → reopen for each value
+                col = chromadb.PersistentClient(path=path).get_collection("sweep")
+                col.modify(configuration={"hnsw": {"ef_search": ef}})
+                latencies, hits = [], 0
+                for qi, q in enumerate(queries):    # one query at a time, like /ask
+                    t0 = time.perf_counter()
+                    res = col.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+                    latencies.append(time.perf_counter() - t0)
+                    found = {id_pos[i] for i in res["ids"][0]}
+                    hits += len(found & set(truth[qi].tolist()))
+                lat = np.asarray(latencies) * 1000
+                row = {"space": space, "M": m, "construction_ef": efc, "search_ef": ef,
+                       "build_s": round(build_s, 3), "disk_mb": round(disk / 1e6, 2),
+                       "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                       "p95_ms": round(float(np.percentile(lat, 95)), 3),
+                       f"recall@{k}": round(hits / (len(queries) * k), 4)}
+                rows.append(row)
+                print("  ".join(f"{key}={val}" for key, val in row.items()))
+                SharedSystemClient.clear_system_cache()
+        finally:
+            SharedSystemClient.clear_system_cache()
+            shutil.rmtree(path, ignore_errors=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep HNSW parameters: build time, size, latency, recall@k "
+                    "against exact search over the vectors of a built collection")
+    parser.add_argument("--collection", default=settings.CHROMA_COLLECTION)
+    parser.add_argument("--queries", help="JSONL ({\"query\": ...}) or one question per line "
+                                          "(default: sample stored vectors)")
+    parser.add_argument("--sample", type=int, default=200, help="Queries sampled from the index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--space", default=settings.HNSW_SPACE, help="e.g. l2,cosine")
+    parser.add_argument("--m", type=_ints, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=_ints, default=[50, 100, 200])
+    parser.add_argument("--search-ef", type=_ints, default=[10, 25, 50, 100])
+    parser.add_argument("--out", help="Write results as .csv or .json")
+    args = parser.parse_args()
+
+    ids, vectors = load_vectors(args.collection)
+    if not len(ids):
+        raise SystemExit(f"[ERROR] Collection '{args.collection}' is empty")
+    queries = load_queries(args.queries, vectors, args.sample, args.seed)
+    print(f"[INFO] {len(ids)} vectors (dim {vectors.shape[1]}), {len(queries)} queries, "
+          f"k={args.k}", file=sys.stderr)
+
+    rows = sweep(ids, vectors, queries, [s.strip() for s in args.space.split(",")],
+                 args.m, args.construction_ef, args.search_ef, args.k)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            if args.out.endswith(".json"):
+                json.dump(rows, f, indent=2)
+            else:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"[OK] Results → {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
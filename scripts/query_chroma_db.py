@@ -1,36 +1,42 @@
 # scripts/query_chroma_db.py
 
-import os
-from langchain_chroma import Chroma
+import argparse
+import sys
 from rag.pipeline import rag_query
-from rag.metadata_matcher import init_embeddings  # IMPORTANT
-from langchain_ollama import OllamaEmbeddings
+from rag.index_registry import UnknownCollectionError, open_collection
 from config.settings import settings
 
 
 def main():
-    db = Chroma(collection_name=settings.CHROMA_COLLECTION,
-                persist_directory=settings.CHROMA_PERSIST_DIR,
-                embedding_function=OllamaEmbeddings(model=settings.OLLAMA_EMBEDDING_MODEL,
-                                                    base_url=os.getenv("OLLAMA_HOST", "http://localhost:11434")))
-
-    # ---------- LOAD CHAPTERS FIRST ----------
-    collection = db.get()
-    chapters = sorted(list({m["chapter"] for m in collection["metadatas"]}))
-
-    if chapters:
-        init_embeddings(chapters)
-        print(f"\n[INFO] Cached {len(chapters)} chapter embeddings.")
+    parser = argparse.ArgumentParser(description="Ask questions against the Chroma DB "
+                                                 "(type 'exit' to quit)")
+    parser.add_argument("--collection", default=settings.CHROMA_COLLECTION)
+    args = parser.parse_args()
+
+    # ---------- OPEN THE PUBLISHED VERSION (routing from its manifest) ----------
+    try:
+        handle = open_collection(args.collection)
+    except UnknownCollectionError:
+        print(f"[ERROR] No index for collection '{args.collection}' "
+              f"under {settings.CHROMA_PERSIST_DIR}. Build it first.")
+        sys.exit(1)
+
+    if len(handle.router):
+        print(f"\n[INFO] Loaded {len(handle.router)} chapter vectors "
+              f"(index {handle.index_version}).")
     else:
         print("\n[WARN] No chapters found in DB.")
 
     # ---------- QUERY LOOP ----------
-    while True:
-        q = input("\nAsk something: ")
-        if q.lower() == "exit":
-            print("Exiting...")
-            break
-        print(rag_query(db, q))
+    try:
+        while True:
+            q = input("\nAsk something: ")
+            if q.lower() == "exit":
+                print("Exiting...")
+                break
+            print(rag_query(handle.db, q, router=handle.router, chunk_store=handle.chunks))
+    finally:
+        handle.close()
 
 
 if __name__ == "__main__":
@@ -2,20 +2,20 @@
 
 import json
 import argparse
-from ingestion.pdf_parser import parse_pdf
-from ingestion.chunker import chunk_blocks
 
 from app_logging.parse_logger import parse_logger
 from config.settings import settings
 
-# Optional: import keyword extractor only when required
-try:
-    from ingestion.keyword_extractor import extract_keywords
-    KEYWORD_SUPPORT = True
-except ImportError:
-    parse_logger.warning(
-        "Keyword extractor module not found. Keyword support disabled.")
-    KEYWORD_SUPPORT = False
+
+def load_keyword_extractor():
+    """Optional: import keyword extractor (NLTK) only when required"""
+    try:
+        from ingestion.keyword_extractor import extract_keywords
+        return extract_keywords
+    except ImportError:
+        parse_logger.warning(
+            "Keyword extractor module not found. Keyword support disabled.")
+        return None
 
 
 if __name__ == "__main__":
@@ -29,6 +29,11 @@ if __name__ == "__main__":
                         help="Extract keywords from chunks")
     args = parser.parse_args()
 
+    # PyMuPDF is only needed once there is a PDF to parse
+    from ingestion.pdf_parser import parse_pdf
+    from ingestion.chunker import chunk_blocks
+    extract_keywords = load_keyword_extractor() if args.keywords else None
+
     parse_logger.info(f"Starting ingestion for PDF: {args.pdf}")
 
     # ---- 1) Parse PDF into structured blocks ----
@@ -67,7 +72,7 @@ if __name__ == "__main__":
             msg = "Keyword extraction requested but chunking was not enabled."
             parse_logger.warning(msg)
             print("[WARN] Chunking is required before keyword extraction.")
-        elif not KEYWORD_SUPPORT:
+        elif extract_keywords is None:
             msg = "Keyword extraction requested but keyword extractor module not available."
             parse_logger.error(msg)
             print("[ERROR] Keyword extractor module not found.")
@@ -0,0 +1,44 @@
+# scripts/warm_up.py
+
+import argparse
+import json
+
+from rag.index_registry import open_collection
+from rag.warmup import mine_queries, warm_up
+from config.settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Preload Ollama models and warm caches from the most frequent logged queries")
+    parser.add_argument("--collection", default=settings.CHROMA_COLLECTION)
+    parser.add_argument("--top", type=int, default=settings.WARMUP_TOP_QUERIES,
+                        help="Most frequent queries to embed + route")
+    parser.add_argument("--answers", type=int, default=settings.WARMUP_ANSWERS,
+                        help="Of those, how many to answer")
+    parser.add_argument("--days", type=int, default=settings.WARMUP_LOG_DAYS)
+    parser.add_argument("--no-preload", action="store_true", help="Don't load models")
+    parser.add_argument("--list", action="store_true",
+                        help="Only print the most frequent queries")
+    args = parser.parse_args()
+
+    if args.list:
+        ranked, total = mine_queries(days=args.days)
+        print(f"[INFO] {total} queries logged, {len(ranked)} distinct")
+        for query, count in ranked[:args.top]:
+            print(f"{count:6d}  {query}")
+        return
+
+    # Models stay resident in Ollama for OLLAMA_KEEP_ALIVE after this exits;
+    # the result is saved next to the index → API workers load it instead of re-embedding.
+    handle = open_collection(args.collection)
+    try:
+        report = warm_up(handle, top_n=args.top, answers=args.answers,
+                         preload=not args.no_preload, days=args.days, save=True)
+    finally:
+        handle.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
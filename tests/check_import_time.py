@@ -0,0 +1,86 @@
+"""
+CLI TEST - CHECK THAT THE ENTRY POINTS START FAST
+Imports each entry point in a fresh interpreter under `python -X importtime`
+and fails when one exceeds the budget or pulls in a heavy dependency at import
+time (chromadb, langchain, ollama, NLTK, PyMuPDF must load on first use only).
+Run: python tests/check_import_time.py --budget-ms 500
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    "scripts.build_chroma_db",
+    "scripts.query_chroma_db",
+    "scripts.run_ingestion",
+    "scripts.batch_ask",
+    "scripts.warm_up",
+    "scripts.hnsw_sweep",
+]
+
+HEAVY = ("chromadb", "langchain_chroma", "langchain_core", "langsmith",
+         "ollama", "nltk", "rake_nltk", "fitz")
+
+
+def import_profile(module: str):
+    """{imported module: cumulative µs} for `import module` in a fresh interpreter."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def help_seconds(module: str) -> float:
+    """Wall time of `python -m module --help` (interpreter start included)."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", module, "--help"], cwd=ROOT,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def check(module: str, budget_ms: float, top: int) -> bool:
+    try:
+        times = import_profile(module)
+    except RuntimeError as e:
+        print(f"[ERROR] {module}: import failed → {e}")
+        return False
+
+    total_ms = times.get(module, 0) / 1000
+    heavy = sorted(m for m in times if m.split(".")[0] in HEAVY and "." not in m)
+    ok = total_ms <= budget_ms and not heavy
+
+    print(f"[{'OK' if ok else 'FAIL'}] {module}: import {total_ms:.0f} ms "
+          f"(budget {budget_ms:.0f} ms), --help {help_seconds(module) * 1000:.0f} ms")
+    if heavy:
+        print(f"       heavy imports at module level → {', '.join(heavy)}")
+    if not ok:
+        slowest = sorted(((t, m) for m, t in times.items() if m != module), reverse=True)
+        for t, m in slowest[:top]:
+            print(f"       {t / 1000:8.1f} ms  {m}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=500,
+                        help="Max cumulative import time per entry point")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Slowest imports listed for a failing entry point")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    results = [check(m, args.budget_ms, args.top) for m in args.modules]
+    print(f"\n{sum(results)}/{len(results)} entry points within budget")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,81 @@
+"""
+TEST - ADMISSION CONTROL IN FRONT OF OLLAMA
+Concurrency limit, bounded wait queue, queue timeout and hedge slots.
+Run: python -m pytest -q tests/test_admission_gate.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from rag.ollama_client import AdmissionGate, OverloadedError
+
+
+def test_slots_up_to_max_concurrency():
+    gate = AdmissionGate("test", max_concurrency=2, max_queue=0, queue_timeout=0.05)
+    a, b = gate.acquire(), gate.acquire()
+    assert gate.active == 2 and gate.saturated()
+    with pytest.raises(OverloadedError):
+        gate.acquire()
+    assert gate.rejected == 1
+    gate.release(a)
+    gate.release(b)
+    assert gate.active == 0 and not gate.saturated()
+
+
+def test_waiter_gets_the_released_slot():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=1, queue_timeout=2)
+    started = gate.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(gate.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    assert gate.waiting == 1 and not got
+    gate.release(started)
+    waiter.join(1)
+    assert got and gate.active == 1 and gate.waiting == 0
+
+
+def test_full_queue_rejects_at_once():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=1, queue_timeout=2)
+    started = gate.acquire()
+    waiter = threading.Thread(target=lambda: pytest.raises(OverloadedError, gate.acquire, 0.3))
+    waiter.start()
+    time.sleep(0.1)
+
+    t0 = time.monotonic()
+    with pytest.raises(OverloadedError) as e:
+        gate.acquire()
+    assert time.monotonic() - t0 < 0.1
+    assert e.value.retry_after >= 1
+    waiter.join()
+    gate.release(started)
+
+
+def test_wait_is_bounded_by_the_caller_timeout():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=5, queue_timeout=10)
+    started = gate.acquire()
+    t0 = time.monotonic()
+    with pytest.raises(OverloadedError):
+        gate.acquire(timeout=0.1)
+    assert time.monotonic() - t0 < 1
+    assert gate.waiting == 0
+    gate.release(started)
+
+
+def test_slot_context_releases_on_error():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=0, queue_timeout=0.05)
+    with pytest.raises(RuntimeError):
+        with gate.slot():
+            raise RuntimeError("boom")
+    assert gate.active == 0
+
+
+def test_try_acquire_never_queues():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=5, queue_timeout=10)
+    started = gate.try_acquire()
+    assert started is not None
+    assert gate.try_acquire() is None and gate.waiting == 0
+    gate.release(started)
+    assert gate.active == 0
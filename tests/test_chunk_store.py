@@ -0,0 +1,135 @@
+"""
+TEST - NEIGHBOUR EXPANSION OF THE MEMORY-MAPPED CHUNK STORE
+Writes a small store to a temp dir and checks rebalancing, chapter stops,
+skip sets and empty (page break) chunks.
+Run: python -m pytest -q tests/test_chunk_store.py
+"""
+
+import pytest
+
+from rag.chunk_store import MIN_FRAGMENT_CHARS, ChunkStore, write_chunk_store
+
+SOURCE = "manual.pdf"
+
+
+def words(tag: str, chars: int) -> str:
+    """Text of about `chars` characters, made of words that say where they come from."""
+    out, n = [], 0
+    while len(" ".join(out)) < chars:
+        out.append(f"{tag}w{n}")
+        n += 1
+    return " ".join(out)
+
+
+def chunk(i: int, text: str, chapter: str = "1 Intro") -> dict:
+    return {"source": SOURCE, "chunk_index": i, "chapter": chapter, "text": text}
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+
+    def make(chunks):
+        write_chunk_store(str(tmp_path), chunks)
+        store = ChunkStore(str(tmp_path))
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_text_and_unknown_rows(make_store):
+    store = make_store([chunk(0, "zero"), chunk(1, "one"), chunk(3, "three")])
+    assert len(store) == 4                       # rows 0..3, row 2 is a gap
+    assert store.text(SOURCE, 1) == "one"
+    assert store.text(SOURCE, 2) is None
+    assert store.text(SOURCE, 9) is None
+    assert store.text("other.pdf", 0) is None
+    assert store.neighbours("other.pdf", 0, 100) == ([], [])
+
+
+def test_budget_split_half_and_half(make_store):
+    store = make_store([chunk(i, words(f"c{i}", 300)) for i in range(5)])
+    before, after = store.neighbours(SOURCE, 2, budget_tokens=100)   # 400 chars
+    assert before and after
+    assert sum(map(len, before)) <= 200 + 2      # + the "… " marker
+    assert sum(map(len, after)) <= 200 + 2
+    assert after[0].startswith("c3w0")           # nearest text kept, far end cut
+    assert before[-1].startswith("… ")
+    assert before[-1].endswith(store.text(SOURCE, 1).rsplit(" ", 1)[1])
+
+
+def test_unused_side_goes_to_the_other(make_store):
+    store = make_store([chunk(i, words(f"c{i}", 300)) for i in range(4)])
+    before, after = store.neighbours(SOURCE, 0, budget_tokens=100)   # nothing before
+    assert before == []
+    assert sum(map(len, after)) > 200            # more than its half
+    assert after[0] == store.text(SOURCE, 1)
+    assert after[1].startswith("c2w0") and after[1].endswith(" …")
+
+
+def test_short_remainder_is_dropped(make_store):
+    store = make_store([chunk(0, "hit"), chunk(1, words("a", 380)),
+                        chunk(2, words("b", 300))])
+    before, after = store.neighbours(SOURCE, 0, budget_tokens=100)
+    # 400 - ~380 chars left < MIN_FRAGMENT_CHARS → no fragment of chunk 2
+    assert len(after) == 1 and after[0].startswith("aw0")
+    assert ChunkStore._clip(["x " * 100], MIN_FRAGMENT_CHARS - 1, 1) == []
+    assert ChunkStore._clip(["short", "x " * 100], 40, 1) == ["short"]   # whole chunks stay
+
+
+def test_stops_at_chapter_boundary(make_store):
+    store = make_store([chunk(0, words("p", 100), "1 Intro"),
+                        chunk(1, words("h", 100), "2 Setup"),
+                        chunk(2, words("n", 100), "2 Setup"),
+                        chunk(3, words("x", 100), "3 Usage")])
+    before, after = store.neighbours(SOURCE, 1, budget_tokens=200)
+    assert before == [] and [t[:3] for t in after] == ["nw0"]
+
+    before, after = store.neighbours(SOURCE, 1, budget_tokens=200, same_chapter=False)
+    assert before[0].startswith("pw0")
+    assert [t[:3] for t in after] == ["nw0", "xw0"]
+
+
+def test_stops_at_chunks_in_skip(make_store):
+    store = make_store([chunk(i, words(f"c{i}", 100)) for i in range(5)])
+    before, after = store.neighbours(SOURCE, 2, budget_tokens=200,
+                                     skip={(SOURCE, 1), (SOURCE, 4)})
+    assert before == []                          # chunk 1 is already in the context
+    assert [t[:4] for t in after] == ["c3w0"]    # stops before chunk 4
+    assert sum(map(len, after)) == len(store.text(SOURCE, 3))
+
+
+def test_empty_page_break_chunks_are_stepped_over(make_store):
+    store = make_store([chunk(0, words("a", 100)), chunk(1, "  \n "),
+                        chunk(2, "hit"), chunk(3, ""), chunk(4, words("b", 100))])
+    before, after = store.neighbours(SOURCE, 2, budget_tokens=200)
+    assert [t[:3] for t in before] == ["aw0"]
+    assert [t[:3] for t in after] == ["bw0"]
+
+
+def test_gap_in_chunk_numbers_stops_the_walk(make_store):
+    store = make_store([chunk(0, "hit"), chunk(2, words("far", 100))])
+    assert store.neighbours(SOURCE, 0, budget_tokens=200) == ([], [])
+
+
+def test_expand_keeps_reading_order(make_store):
+    store = make_store([chunk(0, "first part."), chunk(1, "the hit."),
+                        chunk(2, "last part.")])
+
+    class Doc:
+        page_content = "the hit."
+        metadata = {"source": SOURCE, "chunk_index": 1}
+
+    assert store.expand(Doc, budget_tokens=50) == "first part.\nthe hit.\nlast part."
+    Doc.metadata = {"source": SOURCE}
+    assert store.expand(Doc, budget_tokens=50) == "the hit."
+
+
+def test_rewriting_a_source_keeps_the_others(make_store, tmp_path):
+    write_chunk_store(str(tmp_path), [{**chunk(0, "other"), "source": "other.pdf"}])
+    store = make_store([chunk(0, "mine")])
+    assert store.text("other.pdf", 0) == "other"
+    assert store.text(SOURCE, 0) == "mine"
@@ -0,0 +1,103 @@
+"""
+TEST - CIRCUIT BREAKER AND DEADLINE-BOUNDED OLLAMA CALLS
+Breaker states (closed → open → half-open) and what call_bounded does with
+the gate, the breaker and the request deadline.
+Run: python -m pytest -q tests/test_circuit_breaker.py
+"""
+
+import time
+
+import pytest
+
+from rag.deadline import DeadlineExceeded, deadline_scope
+from rag.ollama_client import (AdmissionGate, CircuitBreaker, CircuitOpenError,
+                               OverloadedError, backend_down, call_bounded)
+
+
+def failing():
+    raise ConnectionError("refused")
+
+
+def make(threshold=2, reset=0.2):
+    return (AdmissionGate("test", max_concurrency=1, max_queue=0, queue_timeout=0.05),
+            CircuitBreaker("test", failure_threshold=threshold, reset_timeout=reset))
+
+
+def test_opens_after_threshold_failures_in_a_row():
+    gate, breaker = make(threshold=2)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call_bounded(gate, breaker, "test", failing)
+    assert breaker.state == "open" and breaker.trips == 1
+
+    calls = []
+    with pytest.raises(CircuitOpenError) as e:
+        call_bounded(gate, breaker, "test", lambda: calls.append(1))
+    assert not calls and e.value.retry_after >= 1
+    assert gate.active == 0
+
+
+def test_success_resets_the_count():
+    gate, breaker = make(threshold=2)
+    with pytest.raises(ConnectionError):
+        call_bounded(gate, breaker, "test", failing)
+    assert call_bounded(gate, breaker, "test", lambda: "ok") == "ok"
+    with pytest.raises(ConnectionError):
+        call_bounded(gate, breaker, "test", failing)
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_one_trial():
+    _, breaker = make(threshold=1, reset=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    breaker.before_call()                        # the trial call
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()                    # anyone else while it runs
+
+    breaker.record_failure()                     # trial failed → open again
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_full_queue_is_not_a_backend_failure():
+    gate, breaker = make(threshold=1)
+    started = gate.acquire()
+    with pytest.raises(OverloadedError):
+        call_bounded(gate, breaker, "test", lambda: "never runs")
+    gate.release(started)
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_deadline_stops_waiting_but_slot_is_held_until_the_call_ends():
+    gate, breaker = make()
+    with deadline_scope(0.1):
+        with pytest.raises(DeadlineExceeded):
+            call_bounded(gate, breaker, "test", lambda: time.sleep(0.4))
+    assert gate.active == 1                      # the HTTP call is still running
+    time.sleep(0.5)
+    assert gate.active == 0 and breaker.state == "closed"
+
+
+def test_expired_deadline_skips_the_call():
+    gate, breaker = make()
+    calls = []
+    with deadline_scope(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            call_bounded(gate, breaker, "test", lambda: calls.append(1))
+    assert not calls
+
+
+def test_backend_down():
+    import httpx
+
+    assert backend_down(ConnectionError("refused"))
+    assert backend_down(httpx.ConnectError("refused"))
+    assert backend_down(httpx.ReadTimeout("slow"))
+    assert not backend_down(ValueError("bad request"))
@@ -0,0 +1,178 @@
+"""
+TEST - BYTE-OFFSET LOG READER
+Pagination, tail offsets, record scanning and search on small temp files:
+boundary offsets, lines longer than a page and records straddling a page /
+block break.
+Run: python -m pytest -q tests/test_log_reader.py
+"""
+
+import pytest
+
+from app_logging import reader
+from app_logging.reader import iter_records, read_page, search, tail_offset
+
+LINES = [
+    "2025-11-20 10:00:00 | INFO | QUERY | Query received → install",
+    "2025-11-20 10:00:01 | ERROR | QUERY | Generation failed",
+    "Traceback (most recent call last):",
+    '  File "rag/pipeline.py", line 1',
+    "2025-11-20 10:00:02 | INFO | PARSE | Ingest job done",
+    "2025-11-20 10:00:03 | WARNING | QUERY | Fast path skipped → timeout",
+]
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    def make(lines=LINES, trailing_newline=True):
+        path = tmp_path / "app.log"
+        data = "\n".join(lines) + ("\n" if trailing_newline else "")
+        path.write_bytes(data.encode("utf-8"))
+        return str(path)
+    return make
+
+
+def line_starts(lines=LINES):
+    starts, pos = [], 0
+    for line in lines:
+        starts.append(pos)
+        pos += len((line + "\n").encode("utf-8"))
+    return starts
+
+
+# ---------------- read_page ----------------
+def test_pages_end_on_whole_lines_and_chain_back_to_the_file(log_file):
+    path = log_file()
+    data = open(path, "rb").read().decode("utf-8")
+    offset, pages = 0, []
+    while True:
+        page = read_page(path, offset, limit=90)      # every page break falls mid-line
+        assert page["offset"] == offset
+        assert page["content"].endswith("\n")
+        pages.append(page["content"])
+        offset = page["next_offset"]
+        if page["eof"]:
+            break
+    assert "".join(pages) == data
+    assert len(pages) > 1
+
+
+def test_offset_inside_a_line_moves_to_the_next_line(log_file):
+    path = log_file()
+    starts = line_starts()
+    assert read_page(path, starts[1])["offset"] == starts[1]          # already aligned
+    assert read_page(path, starts[1] + 1)["offset"] == starts[2]
+    assert read_page(path, starts[2] - 1)["offset"] == starts[2]      # on the "\n"
+
+
+def test_negative_and_out_of_range_offsets(log_file):
+    path = log_file()
+    starts = line_starts()
+    last = read_page(path, -10)
+    assert last["offset"] == read_page(path, 0)["size"] and last["eof"]
+    assert last["content"] == ""
+
+    page = read_page(path, starts[-1] - read_page(path, 0)["size"])
+    assert page["content"] == LINES[-1] + "\n" and page["eof"]
+
+    page = read_page(path, -10_000)                                   # before the start
+    assert page["offset"] == 0 and page["eof"]
+
+    page = read_page(path, 10_000)
+    assert page["content"] == "" and page["offset"] == page["size"] and page["eof"]
+
+
+def test_line_longer_than_the_page_is_returned_whole(log_file):
+    long_line = "2025-11-20 10:00:00 | INFO | QUERY | " + "x" * 500
+    path = log_file(["short", long_line, "after"])
+    page = read_page(path, 6, limit=50)
+    assert page["content"] == long_line + "\n"
+    assert read_page(path, page["next_offset"])["content"] == "after\n"
+
+
+def test_last_line_without_newline(log_file):
+    path = log_file(trailing_newline=False)
+    page = read_page(path, line_starts()[-1])
+    assert page["content"] == LINES[-1] and page["eof"]
+
+
+# ---------------- tail_offset ----------------
+def test_tail_offset(log_file):
+    path = log_file()
+    starts = line_starts()
+    size = read_page(path, 0)["size"]
+    assert tail_offset(path, 0) == size
+    assert tail_offset(path, 1) == starts[-1]
+    assert tail_offset(path, 2) == starts[-2]
+    assert tail_offset(path, len(LINES)) == 0
+    assert tail_offset(path, 100) == 0
+
+
+def test_tail_offset_without_trailing_newline(log_file):
+    path = log_file(trailing_newline=False)
+    assert tail_offset(path, 1) == line_starts()[-1]
+    assert tail_offset(path, 3) == line_starts()[-3]
+
+
+def test_tail_offset_across_block_breaks(log_file, monkeypatch):
+    monkeypatch.setattr(reader, "BLOCK_SIZE", 7)      # every line spans several blocks
+    path = log_file()
+    starts = line_starts()
+    for n in range(1, len(LINES) + 1):
+        assert tail_offset(path, n) == starts[-n]
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.log"
+    path.write_bytes(b"")
+    assert tail_offset(str(path), 5) == 0
+    page = read_page(str(path))
+    assert page == {"content": "", "offset": 0, "next_offset": 0, "size": 0, "eof": True}
+
+
+# ---------------- iter_records ----------------
+def test_records_are_contiguous_and_continuations_inherit_the_level(log_file):
+    path = log_file()
+    records = list(iter_records(path))
+    assert [r[4] for r in records] == LINES
+    assert [r[0] for r in records] == line_starts()
+    assert all(a[1] == b[0] for a, b in zip(records, records[1:]))
+    assert [r[2] for r in records] == ["INFO", "ERROR", "ERROR", "ERROR", "INFO", "WARNING"]
+    assert records[3][3] == "QUERY" and records[4][3] == "PARSE"
+
+
+def test_records_from_a_mid_line_offset(log_file):
+    path = log_file()
+    starts = line_starts()
+    records = list(iter_records(path, starts[2] + 3))
+    assert records[0][0] == starts[3]
+    assert records[0][2] == ""                        # the record it continues was skipped
+
+
+# ---------------- search ----------------
+def test_search_filters_and_counts(log_file):
+    path = log_file()
+    result = search(path, level="error")
+    assert [m["line"] for m in result["matches"]] == LINES[1:4]
+    assert result["level_counts"] == {"INFO": 2, "ERROR": 1, "WARNING": 1}
+    assert result["eof"]
+
+    assert [m["line"] for m in search(path, logger="parse")["matches"]] == [LINES[4]]
+    matches = search(path, text="FAST PATH", level="warning")["matches"]
+    assert matches == [{"offset": line_starts()[5], "line": LINES[5]}]
+
+
+def test_search_resumes_from_next_offset(log_file):
+    path = log_file()
+    first = search(path, logger="QUERY", max_results=1)
+    assert [m["line"] for m in first["matches"]] == LINES[:1] and not first["eof"]
+    assert first["next_offset"] == line_starts()[1]
+    rest = search(path, logger="QUERY", offset=first["next_offset"])
+    assert [m["line"] for m in rest["matches"]] == LINES[1:4] + [LINES[5]]
+
+
+def test_search_stops_after_max_scan_bytes(log_file):
+    path = log_file()
+    starts = line_starts()
+    result = search(path, max_scan_bytes=starts[2])
+    assert result["next_offset"] == starts[2] and not result["eof"]
+    assert len(result["matches"]) == 2
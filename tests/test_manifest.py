@@ -0,0 +1,125 @@
+"""
+TEST - VERSIONED INDEX LAYOUT
+CURRENT swaps, RETIRED marks and pruning on a temp CHROMA_PERSIST_DIR: the
+live version and recently retired ones must survive a prune.
+Run: python -m pytest -q tests/test_manifest.py
+"""
+
+import os
+import time
+
+import pytest
+
+from config.settings import settings
+from rag.manifest import (RETIRED, collection_dir, collection_root, current_version,
+                          new_version_dir, prune_versions, publish_version)
+
+COLLECTION = "manual_test"
+
+
+@pytest.fixture(autouse=True)
+def persist_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMA_PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "INDEX_KEEP_VERSIONS", 2)
+    monkeypatch.setattr(settings, "INDEX_PRUNE_MIN_AGE", 0)
+    return tmp_path
+
+
+def make_version(name: str) -> str:
+    vdir = os.path.join(collection_root(COLLECTION), "versions", name)
+    os.makedirs(vdir)
+    open(os.path.join(vdir, "chroma.sqlite3"), "wb").close()
+    return vdir
+
+
+def versions() -> list:
+    return sorted(os.listdir(os.path.join(collection_root(COLLECTION), "versions")))
+
+
+def age(vdir: str, seconds: float):
+    """Pretend `vdir` was retired (or built) `seconds` ago."""
+    then = time.time() - seconds
+    path = os.path.join(vdir, RETIRED)
+    os.utime(path if os.path.exists(path) else vdir, (then, then))
+
+
+def test_publish_swaps_current_and_retires_the_previous_version():
+    v1, v2 = make_version("v1"), make_version("v2")
+    assert current_version(COLLECTION) is None
+    assert collection_dir(COLLECTION) is None
+
+    publish_version(COLLECTION, "v1")
+    assert current_version(COLLECTION) == "v1"
+    assert collection_dir(COLLECTION) == v1
+    assert not os.path.exists(os.path.join(v1, RETIRED))
+
+    publish_version(COLLECTION, "v2")
+    assert current_version(COLLECTION) == "v2"
+    assert collection_dir(COLLECTION) == v2
+    assert os.path.exists(os.path.join(v1, RETIRED))
+    assert not os.path.exists(os.path.join(v2, RETIRED))
+    assert not os.path.exists(os.path.join(collection_root(COLLECTION), "CURRENT.tmp"))
+
+
+def test_republishing_the_live_version_retires_nothing():
+    v1 = make_version("v1")
+    publish_version(COLLECTION, "v1")
+    publish_version(COLLECTION, "v1")
+    assert not os.path.exists(os.path.join(v1, RETIRED))
+
+
+def test_prune_keeps_the_newest_and_the_live_version():
+    for name in ("v1", "v2", "v3", "v4"):
+        make_version(name)
+    publish_version(COLLECTION, "v1", keep=10)      # rolled back to the oldest build
+    assert prune_versions(COLLECTION, keep=2) == ["v2", "v3"]
+    assert versions() == ["v1", "v4"]
+    assert collection_dir(COLLECTION).endswith("v1")
+
+
+def test_recently_retired_versions_survive_a_prune(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_PRUNE_MIN_AGE", 60)
+    v1, v2 = make_version("v1"), make_version("v2")
+    make_version("v3")
+    publish_version(COLLECTION, "v1")
+    publish_version(COLLECTION, "v2")                # v1 retired just now
+    publish_version(COLLECTION, "v3")                # v2 retired just now
+    assert versions() == ["v1", "v2", "v3"]          # workers may still be on v1 / v2
+
+    age(v1, 120)
+    assert prune_versions(COLLECTION, keep=2) == ["v1"]
+    assert prune_versions(COLLECTION, keep=1) == []  # v2 still too recent
+    age(v2, 120)
+    assert prune_versions(COLLECTION, keep=1) == ["v2"]
+    assert versions() == ["v3"]
+
+
+def test_unpublished_builds_age_by_directory_time(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_PRUNE_MIN_AGE", 60)
+    old, fresh = make_version("v1"), make_version("v2")
+    make_version("v3")
+    publish_version(COLLECTION, "v3", keep=10)
+    age(old, 3600)
+    assert prune_versions(COLLECTION, keep=1) == ["v1"]   # v2 may still be building
+    assert os.path.isdir(fresh)
+
+
+def test_new_version_dirs_never_collide():
+    a = new_version_dir(COLLECTION)
+    b = new_version_dir(COLLECTION)
+    assert a[0] != b[0] and os.path.isdir(a[1]) and os.path.isdir(b[1])
+    assert current_version(COLLECTION) is None        # building does not publish
+
+
+def test_collection_dir_falls_back_to_older_layouts(persist_dir):
+    os.makedirs(collection_root(COLLECTION))
+    with open(os.path.join(collection_root(COLLECTION), "CURRENT"), "w") as f:
+        f.write("gone")                              # points at a deleted version
+    assert collection_dir(COLLECTION) is None
+
+    open(os.path.join(collection_root(COLLECTION), "chroma.sqlite3"), "wb").close()
+    assert collection_dir(COLLECTION) == collection_root(COLLECTION)
+
+    open(os.path.join(persist_dir, "chroma.sqlite3"), "wb").close()
+    assert collection_dir(settings.CHROMA_COLLECTION) == str(persist_dir)
+    assert collection_dir("other") is None           # flat layout = default collection only
@@ -0,0 +1,102 @@
+"""
+TEST - QUERY CACHES AND THE SHARED WARM-UP FILE
+LRU eviction / counters, query normalisation, and loading a warm-up that
+another worker wrote (no Ollama calls).
+Run: python -m pytest -q tests/test_query_cache.py
+"""
+
+import time
+from types import SimpleNamespace
+
+from config.settings import settings
+from rag import warmup
+from rag.query_cache import LRUCache, embed_query_cached, embedding_cache, normalize_query
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1                   # "b" is now the oldest
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert len(cache) == 2
+
+
+def test_counters_and_peek():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    assert cache.get("a") == 1 and cache.get("x") is None
+    assert cache.peek("a") == 1 and cache.peek("x") is None
+    assert cache.stats() == {"size": 1, "max_size": 2, "hits": 1, "misses": 1}
+
+
+def test_peek_does_not_refresh():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.peek("a")
+    cache.put("c", 3)
+    assert "a" not in cache
+
+
+def test_size_zero_disables_the_cache():
+    cache = LRUCache(0)
+    cache.put("a", 1)
+    assert len(cache) == 0 and cache.get("a") is None
+
+
+def test_normalize_query():
+    assert normalize_query("  How do I\tInstall  VirtualBox ") == "how do i install virtualbox"
+
+
+def test_embed_query_cached_embeds_once():
+    calls = []
+
+    class Embedder:
+        def embed_query(self, text):
+            calls.append(text)
+            return [1.0, 0.0]
+
+    query = f"cache test {time.time()}"
+    assert embed_query_cached(Embedder(), query) == [1.0, 0.0]
+    assert embed_query_cached(Embedder(), "  " + query.upper()) == [1.0, 0.0]
+    assert calls == [query]
+
+
+class Router:
+    def __init__(self):
+        self.cache = LRUCache(10)
+
+    def top_chapters_batch(self, vecs, top_k=5):
+        return [[("1 Intro", float(v[0]))] for v in vecs]
+
+
+def make_handle(tmp_path):
+    return SimpleNamespace(persist_dir=str(tmp_path), router=Router(), answers=LRUCache(10))
+
+
+def test_warm_cache_round_trip(tmp_path):
+    writer = make_handle(tmp_path)
+    writer.answers.put(("first question", False), {"response": "r", "path": "generated",
+                                                   "citations": []})
+    warmup._save_warm_cache(writer, ["First question", "Second"], [[0.5, 0.5], [0.25, 0.75]],
+                            {"seconds": 1.0, "warmed_queries": 2, "coverage": 0.5})
+
+    reader = make_handle(tmp_path)
+    report = warmup.load_warm_cache(reader)
+    assert report["source"] == "shared" and report["warmed_queries"] == 2
+    assert reader.router.cache.peek(("second", 5)) == [("1 Intro", 0.25)]
+    assert reader.answers.peek(("first question", False))["response"] == "r"
+    key = (settings.OLLAMA_EMBEDDING_MODEL, "second")
+    assert embedding_cache.peek(key) == [0.25, 0.75]
+
+
+def test_stale_or_missing_warm_cache_is_ignored(tmp_path, monkeypatch):
+    handle = make_handle(tmp_path)
+    assert warmup.load_warm_cache(handle) is None
+
+    warmup._save_warm_cache(handle, [], [], {"seconds": 0.0})
+    assert warmup.load_warm_cache(handle)["source"] == "shared"
+    monkeypatch.setattr(settings, "WARMUP_CACHE_TTL", -1)
+    assert warmup.load_warm_cache(handle) is None
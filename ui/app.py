@@ -2,7 +2,6 @@
 
 import streamlit as st
 import requests
-import re  # NEW
 
 API_URL = "http://localhost:8000/ask"
 API_BASE = "http://localhost:8000"    # NEW
@@ -24,22 +23,61 @@ if page == "Chat":
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # ---- Which manual (collection) to ask ----
+    @st.cache_data(ttl=60)
+    def get_collections():
+        try:
+            res = requests.get(f"{API_BASE}/collections")
+            if res.status_code == 200:
+                return res.json().get("available", [])
+        except requests.RequestException:
+            pass
+        return []
+
+    collections = get_collections()
+    collection = st.sidebar.selectbox("📚 Manual", collections) if collections else None
+
+    if st.sidebar.button("🆕 New conversation"):
+        st.session_state.messages = []
+        st.session_state.session_id = None
+        st.rerun()
+
     chat_container = st.container()
     with chat_container:
         for msg in st.session_state.messages:
             st.chat_message(msg["role"]).write(msg["content"])
 
+    # ⚡ last answer came from the fast path → offer the generated one
+    full_query = None
+    last = st.session_state.messages[-1] if st.session_state.messages else None
+    if last and last.get("path") == "extractive":
+        if st.button("💬 Full answer"):
+            full_query = last["query"]
+
     query = st.chat_input("Ask anything...")
-    if query:
-        st.session_state.messages.append({"role": "user", "content": query})
+    if query or full_query:
+        if query:
+            st.session_state.messages.append({"role": "user", "content": query})
+        path = None
 
         with st.spinner("Thinking..."):
-            res = requests.post(API_URL, params={"query": query})
-            answer = res.json().get(
-                "response", "No answer") if res.status_code == 200 else f"Error: {res.text}"
+            params = {"query": query or full_query,
+                      "session_id": st.session_state.get("session_id"),
+                      "collection": collection,
+                      "full": bool(full_query)}
+            res = requests.post(API_URL, params=params)
+            if res.status_code == 200:
+                body = res.json()
+                answer = body.get("response", "No answer")
+                path = body.get("path")
+                # keep the server-side session → follow-ups reuse retrieval
+                st.session_state.session_id = body.get("session_id")
+            else:
+                answer = f"Error: {res.text}"
 
         st.session_state.messages.append(
-            {"role": "assistant", "content": answer})
+            {"role": "assistant", "content": answer,
+             "path": path, "query": query or full_query})
         st.rerun()
 
 
@@ -79,39 +117,92 @@ else:
     # ---- Sidebar File selector ----
     selected_file = st.sidebar.selectbox("📁 Select Log File", files)
 
-    # ---- Fetch content ----
-    def fetch_log_content(filename):
-        res = requests.get(f"{API_BASE}/logs/{filename}")
+    # ---- Paging state (byte offsets, newest page first) ----
+    PAGE_BYTES = 64 * 1024
+    if st.session_state.get("log_file") != selected_file:
+        st.session_state.log_file = selected_file
+        st.session_state.log_offset = -PAGE_BYTES   # last page of the file
+
+    # ---- Fetch one page ----
+    def fetch_log_page(filename, offset):
+        res = requests.get(f"{API_BASE}/logs/{filename}",
+                           params={"offset": offset, "limit": PAGE_BYTES})
+        if res.status_code == 200:
+            return res.json()
+        return {"content": f"Error: {res.text}", "offset": 0,
+                "next_offset": 0, "size": 0, "eof": True}
+
+    # ---- Server-side search ----
+    def search_log(filename, text, level, logger):
+        params = {"q": text or None, "level": level or None,
+                  "logger": logger or None, "max_results": 500}
+        res = requests.get(f"{API_BASE}/logs/{filename}/search", params=params)
         if res.status_code == 200:
-            return res.json().get("content", "")
-        return f"Error: {res.text}"
-
-    log_content = fetch_log_content(selected_file)
-
-    # ---- Search ----
-    search_query = st.text_input("🔍 Search Logs")
-    if search_query:
-        matches = re.findall(
-            rf".*{re.escape(search_query)}.*", log_content, re.IGNORECASE)
-        st.write(f"🔎 **Found `{len(matches)}` matches**")
-        display_text = "\n".join(matches) if matches else "⚠ No results."
+            return res.json()
+        return {"matches": [], "level_counts": {}, "eof": True,
+                "error": res.text}
+
+    # ---- Filters ----
+    col1, col2, col3 = st.columns([3, 1, 1])
+    search_query = col1.text_input("🔍 Search Logs")
+    level = col2.selectbox("Level", ["", "INFO", "WARNING", "ERROR"])
+    logger_name = col3.selectbox("Logger", ["", "QUERY", "LLM", "EMBEDDER", "PARSER"])
+
+    if search_query or level or logger_name:
+        result = search_log(selected_file, search_query, level, logger_name)
+        matches = result.get("matches", [])
+        more = "" if result.get("eof") else " (first results only)"
+        st.write(f"🔎 **Found `{len(matches)}` matches**{more}")
+        display_text = "\n".join(m["line"] for m in matches) if matches else "⚠ No results."
+        counts = result.get("level_counts", {})
+        total_lines = sum(counts.values())
     else:
-        display_text = log_content
+        page_data = fetch_log_page(selected_file, st.session_state.log_offset)
+        display_text = page_data["content"]
+        lines = display_text.splitlines()
+        counts = {
+            "ERROR": sum(1 for line in lines if "| ERROR |" in line),
+            "WARNING": sum(1 for line in lines if "| WARNING |" in line),
+        }
+        total_lines = len(lines)
+
+        nav1, nav2, nav3 = st.columns(3)
+        if nav1.button("⬆ Older", disabled=page_data["offset"] == 0):
+            st.session_state.log_offset = max(0, page_data["offset"] - PAGE_BYTES)
+            st.rerun()
+        if nav2.button("⬇ Newer", disabled=page_data["eof"]):
+            st.session_state.log_offset = page_data["next_offset"]
+            st.rerun()
+        if nav3.button("⏭ Latest"):
+            st.session_state.log_offset = -PAGE_BYTES
+            st.rerun()
+        st.caption(f"Bytes {page_data['offset']}–{page_data['next_offset']} "
+                   f"of {page_data['size']}")
 
     # ---- Stats ----
-    lines = log_content.split("\n")
-    error_count = sum(1 for line in lines if "| ERROR |" in line.lower())
-    warn_count = sum(1 for line in lines if "| WARNING|" in line.lower())
-
     st.subheader("📊 Statistics")
-    st.write(f"- **Total lines:** {len(lines)}")
-    st.write(f"- **Errors found:** {error_count}")
-    st.write(f"- **Warnings found:** {warn_count}")
+    st.write(f"- **Lines shown / scanned:** {total_lines}")
+    st.write(f"- **Errors found:** {counts.get('ERROR', 0)}")
+    st.write(f"- **Warnings found:** {counts.get('WARNING', 0)}")
 
     # ---- Display ----
     st.subheader(f"📜 Viewing `{selected_file}`")
     st.code(display_text, language="text")
 
+    # ---- Live tail (streams new lines from the API) ----
+    if st.checkbox("📡 Live tail (30s)"):
+        placeholder = st.empty()
+        tail_lines = []
+        try:
+            with requests.get(f"{API_BASE}/logs/{selected_file}/tail",
+                              params={"lines": 50, "follow": True, "max_seconds": 30},
+                              stream=True, timeout=40) as res:
+                for line in res.iter_lines(decode_unicode=True):
+                    tail_lines = (tail_lines + [line])[-200:]
+                    placeholder.code("\n".join(tail_lines), language="text")
+        except requests.RequestException as e:
+            st.warning(f"Tail stopped: {e}")
+
     # ---- Auto bottom scroll ----
     scroll_js = """
     <script>